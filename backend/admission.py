@@ -0,0 +1,168 @@
+import asyncio
+import contextvars
+import math
+import time
+from collections import Counter, deque
+
+from starlette.responses import JSONResponse
+
+import metrics
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+# Waiting requests are admitted lane by lane, in this order
+LANES = (INTERACTIVE, BULK)
+# Lane of the work running in the current request or job; downstream queues
+# (the model batchers) serve it with the lane's priority
+current_lane = contextvars.ContextVar("admission_lane", default=INTERACTIVE)
+
+
+def lane_priority(lane):
+    """Queue priority of ``lane``, lower is served first."""
+    return LANES.index(lane)
+
+
+class Overloaded(Exception):
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Bounds the inference requests one worker takes on.
+
+    At most ``max_in_flight`` requests run at a time and at most
+    ``max_queued`` wait for a slot; beyond that ``acquire`` raises
+    ``Overloaded`` right away instead of letting latency and memory grow for
+    everyone. Freed slots go to the interactive lane before the bulk lane.
+    A client may hold at most ``per_client`` running or waiting requests
+    (0 for no cap). The suggested retry delay is the current backlog times
+    the moving average of observed service times.
+    """
+    def __init__(self, max_in_flight, max_queued, per_client=0, smoothing=0.2):
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.per_client = per_client
+        self.smoothing = smoothing
+        self.in_flight = 0
+        self.service_time = None
+        self._waiters = {lane: deque() for lane in LANES}
+        self._clients = Counter()
+
+    def queued(self, lane=None):
+        lanes = LANES if lane is None else (lane,)
+        return sum(len(self._waiters[name]) for name in lanes)
+
+    def retry_after(self):
+        """Seconds until a new request would likely get a slot."""
+        service_time = self.service_time or 1.0
+        backlog = self.queued() + self.in_flight
+        return max(1, math.ceil(service_time * backlog / self.max_in_flight))
+
+    async def acquire(self, client=None, lane=INTERACTIVE, wait=False):
+        """
+        Wait for a slot and return the ticket to pass to ``release``.
+        Raises ``Overloaded`` when the queue or the client's cap is full,
+        unless ``wait`` is set (for internal work, which always queues).
+        """
+        if not wait:
+            if client is not None and self.per_client and self._clients[client] >= self.per_client:
+                raise Overloaded("client_limit", self.retry_after())
+            if self.in_flight >= self.max_in_flight and self.queued() >= self.max_queued:
+                raise Overloaded("queue_full", self.retry_after())
+        self._clients[client] += 1
+        if self.in_flight < self.max_in_flight and not self.queued():
+            self.in_flight += 1
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters[lane].append(waiter)
+            try:
+                # release() hands its slot over by resolving the future
+                await waiter
+            except asyncio.CancelledError:
+                try:
+                    if waiter.done() and not waiter.cancelled():
+                        self._free_slot()
+                    elif waiter in self._waiters[lane]:
+                        # release() may have popped it already, skipping it
+                        self._waiters[lane].remove(waiter)
+                finally:
+                    self._forget(client)
+                raise
+        return client, time.monotonic()
+
+    def release(self, ticket):
+        client, admitted_at = ticket
+        elapsed = time.monotonic() - admitted_at
+        if self.service_time is None:
+            self.service_time = elapsed
+        else:
+            self.service_time += self.smoothing * (elapsed - self.service_time)
+        self._forget(client)
+        self._free_slot()
+
+    def _forget(self, client):
+        self._clients[client] -= 1
+        if self._clients[client] <= 0:
+            del self._clients[client]
+
+    def _free_slot(self):
+        for lane in LANES:
+            waiters = self._waiters[lane]
+            while waiters:
+                waiter = waiters.popleft()
+                if not waiter.done():
+                    waiter.set_result(None)
+                    return
+        self.in_flight -= 1
+
+    def stats(self):
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queued": {lane: self.queued(lane) for lane in LANES},
+            "max_queued": self.max_queued,
+            "service_time": self.service_time,
+        }
+
+
+class AdmissionMiddleware:
+    """
+    Runs requests to the paths in ``lanes`` (path -> lane) through an
+    ``AdmissionController`` before their body is read, so a rejected upload
+    costs neither a temp file nor CPU. ``client_key(scope)`` identifies the
+    caller for the per-client cap. Rejections are 503 (worker full) or 429
+    (client over its cap), with ``Retry-After``.
+    """
+    def __init__(self, app, controller, lanes, client_key=None):
+        self.app = app
+        self.controller = controller
+        self.lanes = lanes
+        self.client_key = client_key
+
+    async def __call__(self, scope, receive, send):
+        lane = self.lanes.get(scope["path"]) if scope["type"] == "http" else None
+        if lane is None:
+            await self.app(scope, receive, send)
+            return
+        client = self.client_key(scope) if self.client_key else None
+        try:
+            ticket = await self.controller.acquire(client, lane)
+        except Overloaded as e:
+            metrics.ADMISSION_REJECTED.labels(e.reason).inc()
+            status_code = 429 if e.reason == "client_limit" else 503
+            response = JSONResponse(
+                {"message": "Too many requests, retry later"},
+                status_code=status_code,
+                headers={"Retry-After": str(e.retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+        lane_token = current_lane.set(lane)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_lane.reset(lane_token)
+            self.controller.release(ticket)
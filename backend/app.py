@@ -1,206 +1,170 @@
-from fastapi import FastAPI, File, UploadFile
+from startup import StartupTimer
+startup_timer = StartupTimer()
+
+from fastapi import Depends, FastAPI, File, Form, HTTPException, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse
-from fastapi.staticfiles import StaticFiles
-import shutil
+from fastapi.responses import JSONResponse, FileResponse, PlainTextResponse, StreamingResponse
+import asyncio
+import json
+import time
 import uvicorn
 import os
 
-import torch
-import torch.nn as nn
-import torch.nn.functional as F
-from torchvision import transforms, models
-import matplotlib.pyplot as plt
+from functools import partial
+from typing import List, Optional
 from PIL import Image
 
 from routes import router
 from contextlib import asynccontextmanager
-from db import create_db_and_table
-
-class DoubleConv(nn.Module):
-    """(convolution => [BN] => ReLU) * 2"""
-    def __init__(self, in_channels, out_channels, mid_channels=None):
-        super().__init__()
-        if not mid_channels:
-            mid_channels = out_channels
-        self.double_conv = nn.Sequential(
-            nn.Conv2d(in_channels, mid_channels, kernel_size=3, padding=1, bias=False),
-            nn.BatchNorm2d(mid_channels),
-            nn.ReLU(inplace=True),
-            nn.Conv2d(mid_channels, out_channels, kernel_size=3, padding=1, bias=False),
-            nn.BatchNorm2d(out_channels),
-            nn.ReLU(inplace=True)
-        )
-
-    def forward(self, x):
-        return self.double_conv(x)
-
-class Down(nn.Module):
-    """Downscaling with maxpool then double conv"""
-    def __init__(self, in_channels, out_channels):
-        super().__init__()
-        self.maxpool_conv = nn.Sequential(
-            nn.MaxPool2d(2),
-            DoubleConv(in_channels, out_channels)
-        )
-
-    def forward(self, x):
-        return self.maxpool_conv(x)
-
-class Up(nn.Module):
-    """Upscaling then double conv"""
-    def __init__(self, in_channels, out_channels, bilinear=True):
-        super().__init__()
-        if bilinear:
-            self.up = nn.Upsample(scale_factor=2, mode='bilinear', align_corners=True)
-            self.conv = DoubleConv(in_channels, out_channels, in_channels // 2)
-        else:
-            self.up = nn.ConvTranspose2d(in_channels, in_channels // 2, kernel_size=2, stride=2)
-            self.conv = DoubleConv(in_channels, out_channels)
-
-    def forward(self, x1, x2):
-        x1 = self.up(x1)
-        diffY = x2.size()[2] - x1.size()[2]
-        diffX = x2.size()[3] - x1.size()[3]
-        x1 = F.pad(x1, [diffX // 2, diffX - diffX // 2,
-                        diffY // 2, diffY - diffY // 2])
-        x = torch.cat([x2, x1], dim=1)
-        return self.conv(x)
-
-class OutConv(nn.Module):
-    def __init__(self, in_channels, out_channels):
-        super(OutConv, self).__init__()
-        self.conv = nn.Conv2d(in_channels, out_channels, kernel_size=1)
-
-    def forward(self, x):
-        return self.conv(x)
-
-class UNet(nn.Module):
-    def __init__(self, n_channels, n_classes, bilinear=False):
-        super(UNet, self).__init__()
-        self.n_channels = n_channels
-        self.n_classes = n_classes
-        self.bilinear = bilinear
-
-        self.inc = DoubleConv(n_channels, 64)
-        self.down1 = Down(64, 128)
-        self.down2 = Down(128, 256)
-        self.down3 = Down(256, 512)
-        factor = 2 if bilinear else 1
-        self.down4 = Down(512, 1024 // factor)
-        self.up1 = Up(1024, 512 // factor, bilinear)
-        self.up2 = Up(512, 256 // factor, bilinear)
-        self.up3 = Up(256, 128 // factor, bilinear)
-        self.up4 = Up(128, 64, bilinear)
-        self.outc = OutConv(64, n_classes)
-
-    def forward(self, x):
-        x1 = self.inc(x)
-        x2 = self.down1(x1)
-        x3 = self.down2(x2)
-        x4 = self.down3(x3)
-        x5 = self.down4(x4)
-        x = self.up1(x5, x4)
-        x = self.up2(x, x3)
-        x = self.up3(x, x2)
-        x = self.up4(x, x1)
-        logits = self.outc(x)
-        return logits
-
-# Segmentation model settings
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-seg_model = UNet(n_channels=3, n_classes=1).to(device)
-seg_model_path = "unet_model_medicoin_debjit_2.pth"
+from db import create_db_and_table, dispose_engines
+from inference import MicroBatcher, get_executor, run_blocking, shutdown_executor
+from inference.executor import executor_backlog
+from inference.artifacts import check_formats
+from inference.backends import create_backend
+from inference.predict import class_predict_batch, segment_batch
+from inference.warmup import warmup
+from jobs import job_queue
+from admission import BULK, INTERACTIVE, AdmissionController, AdmissionMiddleware, current_lane, lane_priority
+from passwords import PasswordQueueTimeout, password_hasher
+from principals import Principal, principal_cache
+from reports import patient_exists, pinned_digests, save_reports
+from routes.auth.doctor import ALGORITHM, SECRET_KEY, get_optional_doctor
+from starlette.requests import HTTPConnection
+import jwt
+from procstats import memory_usage
+from storage import ArtifactFiles, ArtifactStore, cleanup_temp_dir, setup_temp_dir
+import config
+import metrics
+startup_timer.mark("imports")
+
+# Load the models for the configured backend (eager, torchscript, compile or onnx)
 try:
-    seg_model.load_state_dict(torch.load(seg_model_path, map_location=device))
-    seg_model.eval()
-except FileNotFoundError:
-    print(f"Error: Segmentation model weights file '{seg_model_path}' not found.")
+    backend = create_backend(config.INFERENCE_BACKEND)
+    print(f"Models loaded with the '{backend.name}' inference backend at {backend.precision}")
+except FileNotFoundError as e:
+    print(f"Error: Model weights file '{e.filename}' not found.")
     exit(1)
-
-seg_transform = transforms.Compose([
-    transforms.Resize((128, 128)),
-    transforms.ToTensor(),
-])
-
-def seg_predict(model, image_path):
-    image = Image.open(image_path).convert("RGB")
-    image_tensor = seg_transform(image).unsqueeze(0).to(device)
-    with torch.no_grad():
-        output = model(image_tensor)
-        output = torch.sigmoid(output)
-        output = (output > 0.5).float()
-    # Return the mask and the original image for reference
-    return output.squeeze().cpu().numpy(), image
-
-
-class VGG19Binary(nn.Module):
-    def __init__(self, freeze_backbone=True):
-        super(VGG19Binary, self).__init__()
-        self.vgg19 = models.vgg19(pretrained=True)
-        if freeze_backbone:
-            for param in self.vgg19.features.parameters():
-                param.requires_grad = False
-        # Modify classifier for binary classification
-        self.vgg19.classifier = nn.Sequential(
-            nn.Linear(512 * 7 * 7, 512),
-            nn.ReLU(True),
-            nn.Dropout(0.5),
-            nn.Linear(512, 256),
-            nn.ReLU(True),
-            nn.Dropout(0.3),
-            nn.Linear(256, 1),
-            nn.Sigmoid()
-        )
-
-    def forward(self, x):
-        return self.vgg19(x)
-
-# Classification model settings
-class_model_path = "custom_vgg19_model.pth"
-class_model = VGG19Binary().to(device)
-try:
-    class_model.load_state_dict(torch.load(class_model_path, map_location=device))
-    class_model.eval()
-    print(f"Classification model loaded from {class_model_path}")
-except FileNotFoundError:
-    print(f"Error: Classification model weights file '{class_model_path}' not found.")
-    exit(1)
-
-class_transform = transforms.Compose([
-    transforms.Resize((224, 224)),
-    transforms.ToTensor(),
-    transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-])
-
-def class_predict(model, image_path):
-    """
-    Predict the class of an image using the VGG19Binary model.
-    Returns:
-      - prob (float): Confidence (probability) output.
-      - pred_class (int): 1 for Malignant, 0 for benign.
-    """
-    image = Image.open(image_path).convert("RGB")
-    image_tensor = class_transform(image).unsqueeze(0).to(device)
-    with torch.no_grad():
-        output = model(image_tensor)
-        prob = output.item()
-        pred_class = 1 if prob > 0.5 else 0
-    return prob, pred_class
+startup_timer.mark("load_models")
+
+# Segmentation and classification are batched separately, so a mask is ready
+# (and can be streamed) before VGG19 runs, and the next segmentation batch
+# overlaps the current classification batch.
+segment_batcher = MicroBatcher(
+    partial(segment_batch, backend),
+    max_batch_size=config.MAX_BATCH_SIZE,
+    max_wait_ms=config.MAX_BATCH_WAIT_MS,
+)
+classify_batcher = MicroBatcher(
+    partial(class_predict_batch, backend),
+    max_batch_size=config.MAX_BATCH_SIZE,
+    max_wait_ms=config.MAX_BATCH_WAIT_MS,
+)
 
 @asynccontextmanager
-async def lifespan(_: FastAPI):
+async def lifespan(app: FastAPI):
+  temp_dir = setup_temp_dir(config.TEMP_DIR)
   create_db_and_table()
+  startup_timer.mark("database")
+  get_executor()
+  segment_batcher.start()
+  classify_batcher.start()
+  startup_timer.mark("executor")
+  startup_timer.finish()
+  # Serve liveness right away but report not-ready until warm-up has run
+  app.state.ready = False
+  warmup_task = asyncio.create_task(warm_up(app))
+  job_queue.start(run_job)
+  artifact_store.start()
   yield
+  warmup_task.cancel()
+  await artifact_store.stop()
+  await job_queue.stop()
+  await segment_batcher.stop()
+  await classify_batcher.stop()
+  shutdown_executor()
+  password_hasher.shutdown()
+  await dispose_engines()
+  cleanup_temp_dir(temp_dir)
+
+async def warm_up(app: FastAPI):
+  try:
+    if config.WARMUP_ROUNDS > 0:
+      ms = await run_blocking(warmup, backend, config.WARMUP_BATCH_SIZES, config.WARMUP_ROUNDS)
+      startup_timer.record("warmup", ms)
+      print(f"Warm-up finished in {ms:.0f} ms (batch sizes {config.WARMUP_BATCH_SIZES})")
+    app.state.ready = True
+  except Exception as e:
+    print(f"Error: warm-up failed, the worker stays not ready: {e}")
 
 app = FastAPI(lifespan=lifespan)
 app.include_router(router, prefix="/api")
 
 # Serve static files (segmentation/classification images)
-STATIC_DIR = "static"
-os.makedirs(STATIC_DIR, exist_ok=True)
-app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
+check_formats(config.MASK_FORMAT, config.ANNOTATED_FORMAT)
+artifact_store = ArtifactStore(
+    config.ARTIFACT_DIR,
+    max_bytes=config.ARTIFACT_MAX_BYTES or None,
+    ttl=config.ARTIFACT_TTL_SECONDS or None,
+    gc_interval=config.ARTIFACT_GC_INTERVAL,
+    # Stored reports keep linking to their artifacts
+    pinned=pinned_digests,
+)
+app.mount("/static", ArtifactFiles(directory=config.ARTIFACT_DIR), name="static")
+
+
+def client_address(connection):
+    """
+    The caller's address. Requests from a trusted proxy are attributed to the
+    nearest untrusted address in X-Forwarded-For, or to no one without it.
+    """
+    host = connection.client.host if connection.client else None
+    if host not in config.ADMISSION_TRUSTED_PROXIES:
+        return host
+    forwarded = [address.strip() for address in connection.headers.get("x-forwarded-for", "").split(",")]
+    # Proxies append the address they received from, so read from the right
+    for address in reversed([address for address in forwarded if address]):
+        if address not in config.ADMISSION_TRUSTED_PROXIES:
+            return address
+    return None
+
+def client_key(scope):
+    """
+    The doctor of a valid bearer token or token cookie, else the client
+    address; None (no per-client cap) when neither is known.
+    """
+    connection = HTTPConnection(scope)
+    token = connection.cookies.get("token")
+    authorization = connection.headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        token = authorization[len("bearer "):]
+    if token:
+        try:
+            return f"doctor:{jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])['id']}"
+        except (jwt.InvalidTokenError, KeyError):
+            pass
+    address = client_address(connection)
+    return f"address:{address}" if address else None
+
+# Bound the inference work this worker takes on; batches queue behind single images
+admission = AdmissionController(
+    max_in_flight=config.ADMISSION_MAX_IN_FLIGHT,
+    max_queued=config.ADMISSION_MAX_QUEUED,
+    per_client=config.ADMISSION_PER_CLIENT,
+)
+app.add_middleware(
+    AdmissionMiddleware,
+    controller=admission,
+    lanes={"/process/": INTERACTIVE, "/process/stream": INTERACTIVE, "/process/batch": BULK},
+    client_key=client_key,
+)
 
+@app.exception_handler(PasswordQueueTimeout)
+async def password_queue_timeout(request, exc):
+    return JSONResponse(
+        {"message": "Too many sign-ins, retry later"},
+        status_code=503,
+        headers={"Retry-After": str(exc.retry_after)},
+    )
 
 # Allow CORS for all origins
 app.add_middleware(
@@ -209,40 +173,31 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After"],
 )
 
 import numpy as np
 from io import BytesIO
 import zipfile
 
-import pydicom
-from pydicom.errors import InvalidDicomError
-
-def dicom_to_png(dicom_path, png_path):
-    """Convert a DICOM file to a PNG image."""
-    ds = pydicom.dcmread(dicom_path)
-    arr = ds.pixel_array.astype(np.float32)
-    # Normalize to 0-255
-    arr -= arr.min()
-    arr /= arr.max() if arr.max() > 0 else 1
-    arr = (arr * 255).astype(np.uint8)
-    # Convert to RGB if needed
-    if len(arr.shape) == 2:
-        img = Image.fromarray(arr).convert("RGB")
-    else:
-        img = Image.fromarray(arr)
-    img.save(png_path)
-    return png_path
-
-def get_bounding_box(mask):
-    """Get bounding box (x_min, y_min, x_max, y_max) from a binary mask."""
-    mask = (mask > 0.5).astype(np.uint8)
-    coords = np.argwhere(mask)
-    if coords.size == 0:
-        return None
-    y_min, x_min = coords.min(axis=0)
-    y_max, x_max = coords.max(axis=0)
-    return x_min, y_min, x_max, y_max
+from inference.cache import InferenceCache, image_key, weights_version
+from inference.artifacts import encode_image, encode_mask_png, mask_to_rle, to_base64
+from inference.imaging import decode_frames
+from inference.postprocess import find_lesions
+
+# Results are keyed by pixel content and weights, so re-uploads skip inference
+model_version = f"{weights_version(*backend.weight_files)}-{backend.name}-{backend.precision}"
+if config.SEG_TILED:
+    # Tiled masks differ in resolution and content from 128x128 ones
+    model_version += (
+        f"-tiled{config.TILE_SIZE}x{config.TILE_OVERLAP}"
+        f"-{config.TILED_MIN_SIDE}-{config.TILED_MAX_SIDE}"
+    )
+inference_cache = InferenceCache(
+    max_bytes=config.CACHE_MAX_BYTES,
+    ttl=config.CACHE_TTL_SECONDS or None,
+    disk_dir=config.CACHE_DIR or None,
+)
 
 def draw_bounding_box(image, bbox, label=None, prob=None):
     """Draw bounding box and optional label on a PIL image."""
@@ -263,86 +218,458 @@ def draw_bounding_box(image, bbox, label=None, prob=None):
         draw.text((x_min, y_min - 20), text, fill="red", font=font)
     return image
 
+def next_frame(frames):
+    """Decode the next frame of an upload and compute the cache key of its pixels."""
+    image = next(frames, None)
+    if image is None:
+        return None
+    return image, image_key(image, model_version)
+
+async def analyze_image(image, on_segmented=None):
+    """
+    Segment and classify one decoded image.
+    Returns a dict with the low-resolution ``mask``, the overall ``bbox`` and
+    per-lesion boxes and areas (``lesions``) in original image coordinates,
+    and the ``classification``, suitable for the inference cache.
+    ``on_segmented`` is called with the result so far (no classification
+    yet) as soon as the mask and boxes are known. Images of interactive
+    requests go through the model batchers ahead of bulk ones.
+    """
+    priority = lane_priority(current_lane.get())
+    mask = (await segment_batcher.submit(image, priority)).astype(np.uint8)
+    result = {"mask": mask, "bbox": None, "lesions": [], "classification": None}
+    if not mask.any():
+        if on_segmented is not None:
+            on_segmented(result)
+        return result
+    # Classify positive images while their boxes are found on the 128x128
+    # mask and scaled up analytically
+    classifying = asyncio.create_task(classify_batcher.submit(image, priority))
+    try:
+        result["bbox"], result["lesions"] = await run_blocking(
+            timed_stage, "lesions", find_lesions, mask, (image.shape[1], image.shape[0])
+        )
+        if on_segmented is not None:
+            on_segmented(dict(result))
+        result["classification"] = await classifying
+    finally:
+        classifying.cancel()
+    return result
+
+def timed_stage(stage, fn, *args):
+    with metrics.STAGE_SECONDS.labels(stage).time():
+        return fn(*args)
+
+def data_uri(data, media_type):
+    return f"data:{media_type};base64,{to_base64(data)}"
+
+def save_mask(mask):
+    """Encode the mask and store it; returns its part of the response body."""
+    response = {}
+    if config.MASK_FORMAT == "rle":
+        response["segmentation_mask_rle"] = timed_stage("encode_mask", mask_to_rle, mask)
+    else:
+        mask_data = timed_stage("encode_mask", encode_mask_png, mask)
+        path = timed_stage("artifact_write", artifact_store.put, mask_data, "png")
+        response["segmentation_mask_url"] = f"/static/{path}"
+        if config.INLINE_ARTIFACTS:
+            response["segmentation_mask_data"] = data_uri(mask_data, "image/png")
+    response["has_segment"] = bool(mask.any())
+    metrics.CASES.labels("positive" if response["has_segment"] else "negative").inc()
+    return response
+
+def save_annotated(image, lesions):
+    """Draw one bounding box per lesion on the original image and store it."""
+    with metrics.STAGE_SECONDS.labels("annotate").time():
+        boxed_image = Image.fromarray(image)
+        for i, lesion in enumerate(lesions, start=1):
+            label = f"Lesion {i}" if len(lesions) > 1 else None
+            boxed_image = draw_bounding_box(boxed_image, lesion["bbox"], label)
+    with metrics.STAGE_SECONDS.labels("encode_annotated").time():
+        annotated_data, extension, media_type = encode_image(
+            boxed_image, config.ANNOTATED_FORMAT, config.ANNOTATED_QUALITY
+        )
+    path = timed_stage("artifact_write", artifact_store.put, annotated_data, extension)
+    response = {"annotated_image_url": f"/static/{path}"}
+    if config.INLINE_ARTIFACTS:
+        response["annotated_image_data"] = data_uri(annotated_data, media_type)
+    return response
+
+def classification_response(classification):
+    prob, pred_class = classification
+    label = "Malignant" if pred_class == 1 else "Benign"
+    return {
+        "classification": {
+            "prediction": label,
+            "probability": round(prob * 100, 2)
+        }
+    }
+
+def save_results(image, result):
+    """Encode the mask and annotated image, store them as artifacts and build the response body."""
+    response = save_mask(result["mask"])
+    if response["has_segment"]:
+        if result["lesions"]:
+            response.update(save_annotated(image, result["lesions"]))
+        response["lesions"] = result["lesions"]
+        response.update(classification_response(result["classification"]))
+    return response
+
+async def run_frame(image, key):
+    # Identical scans (re-uploads, client retries) share one computation
+    result = await inference_cache.get_or_compute(key, lambda: analyze_image(image))
+    return result, await run_blocking(save_results, image, result)
+
+async def run_pipeline(data, results=None):
+    """
+    Decode one upload, analyze it (through the cache) and write its artifacts.
+    Multi-frame DICOM files are decoded one frame at a time, with at most
+    MAX_BATCH_SIZE frames in flight; the response carries the first frame's
+    results plus ``frame_count`` and one entry per frame under ``frames``.
+    When ``results`` is a list, the frames' inference results are appended
+    to it in order.
+    """
+    # All decoding, inference and encoding runs on the CPU-bound executor so
+    # the event loop stays free for other routes while this request waits.
+    _, count, frames = await run_blocking(decode_frames, data)
+    if count == 1:
+        frame = await run_blocking(next_frame, frames)
+        if frame is None:
+            raise ValueError("Image has no frames")
+        result, response = await run_frame(*frame)
+        if results is not None:
+            results.append(result)
+        return response
+
+    tasks = []
+    try:
+        for _ in range(count):
+            frame = await run_blocking(next_frame, frames)
+            if frame is None:
+                break
+            pending = [task for task in tasks if not task.done()]
+            if len(pending) >= config.MAX_BATCH_SIZE:
+                await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            tasks.append(asyncio.create_task(run_frame(*frame)))
+        analyzed = await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+    if results is not None:
+        results.extend(result for result, _ in analyzed)
+    return combine_frames([response for _, response in analyzed])
+
+def combine_frames(responses):
+    """Response body of a multi-frame upload: the first frame's results plus every frame's."""
+    if not responses:
+        raise ValueError("Image has no frames")
+    frame_responses = [{"frame": index, **response} for index, response in enumerate(responses)]
+    return {**responses[0], "frame_count": len(responses), "frames": frame_responses}
+
+async def run_job(data):
+    # Background jobs wait for a slot in the bulk lane instead of being rejected
+    ticket = await admission.acquire(lane=BULK, wait=True)
+    lane_token = current_lane.set(BULK)
+    try:
+        with metrics.track_request("job"):
+            return await run_pipeline(data)
+    finally:
+        current_lane.reset(lane_token)
+        admission.release(ticket)
+
+def attach_report_ids(response, report_ids):
+    response["report_id"] = report_ids[0]
+    for frame_response, report_id in zip(response.get("frames", []), report_ids):
+        frame_response["report_id"] = report_id
+
 @app.post("/process/")
 async def process_image(
-    file: UploadFile = File(...)
+    file: UploadFile = File(...),
+    patient_id: Optional[int] = Form(None),
+    doctor: Optional[Principal] = Depends(get_optional_doctor),
 ):
-    temp_input_path = f"temp_{file.filename}"
-    with open(temp_input_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    """
+    Analyze an image or DICOM file. With ``patient_id``, every analyzed
+    frame is also stored as a report in that patient's history, which
+    takes a signed in doctor.
+    """
+    if patient_id is not None and doctor is None:
+        raise HTTPException(401, "Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    try:
+        if patient_id is not None and not await patient_exists(patient_id):
+            return JSONResponse(status_code=404, content={"message": "Patient not found"})
+        with metrics.track_request("process"):
+            # Read the upload once and decode it straight from memory
+            data = await file.read()
+            if patient_id is None:
+                response = await run_pipeline(data)
+            else:
+                results = []
+                response = await run_pipeline(data, results)
+                attach_report_ids(response, await save_reports(patient_id, results, response))
+        return JSONResponse(content=response)
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"message": f"An error occurred: {str(e)}"})
+
+def sse_event(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
 
-    # Detect DICOM and convert to PNG if needed
-    is_dicom = False
-    temp_png_path = None
+async def frame_stages(image, key):
+    """
+    Analyze one frame, yielding ``(event, payload)`` as each stage finishes:
+    ``segmentation``, then ``annotated`` when there are lesions and
+    ``classification`` when the mask is positive. A cached result yields
+    every stage at once. The last item is ``(None, response)`` with the
+    same body ``/process/`` returns for the frame.
+    """
+    segmented = asyncio.get_running_loop().create_future()
+    def on_segmented(result):
+        if not segmented.done():
+            segmented.set_result(result)
+    analysis = asyncio.create_task(
+        inference_cache.get_or_compute(key, lambda: analyze_image(image, on_segmented))
+    )
     try:
-        # Try reading as DICOM
-        try:
-            ds = pydicom.dcmread(temp_input_path)
-            is_dicom = True
-        except (InvalidDicomError, Exception):
-            is_dicom = False
-
-        if is_dicom:
-            temp_png_path = temp_input_path + ".png"
-            dicom_to_png(temp_input_path, temp_png_path)
-            image_path = temp_png_path
+        await asyncio.wait({segmented, analysis}, return_when=asyncio.FIRST_COMPLETED)
+        # Cache hits never call on_segmented, the whole result is there already
+        result = segmented.result() if segmented.done() else analysis.result()
+        response = await run_blocking(save_mask, result["mask"])
+        if response["has_segment"]:
+            response["lesions"] = result["lesions"]
+        yield "segmentation", dict(response)
+        if response["has_segment"]:
+            if result["lesions"]:
+                annotated = await run_blocking(save_annotated, image, result["lesions"])
+                response.update(annotated)
+                yield "annotated", annotated
+            classification = classification_response((await analysis)["classification"])
+            response.update(classification)
+            yield "classification", classification
         else:
-            image_path = temp_input_path
+            await analysis
+        yield None, response
+    finally:
+        analysis.cancel()
 
-        # Run segmentation prediction
-        prediction, orig_image = seg_predict(seg_model, image_path)
-        seg_filename = f"seg_{os.path.splitext(file.filename)[0]}.png"
-        seg_path = os.path.join(STATIC_DIR, seg_filename)
-        plt.imsave(seg_path, prediction, cmap='gray')
+async def stream_stages(data):
+    """
+    Server-sent events for one upload: ``decoded``, ``segmentation``,
+    ``annotated``, ``classification`` per frame as each stage finishes, then
+    ``done`` with the full response body (or ``error``). Every event carries
+    the ``frame`` index, the stage time ``ms`` and ``elapsed_ms`` since the
+    request started.
+    """
+    start = stage_start = time.perf_counter()
+    def event(name, payload):
+        nonlocal stage_start
+        now = time.perf_counter()
+        payload = {
+            **payload,
+            "ms": round((now - stage_start) * 1000, 1),
+            "elapsed_ms": round((now - start) * 1000, 1),
+        }
+        stage_start = now
+        return sse_event(name, payload)
 
-        has_segment = bool((prediction > 0.5).sum() > 0)
+    try:
+        with metrics.track_request("stream"):
+            fmt, count, frames = await run_blocking(decode_frames, data)
+            responses = []
+            for index in range(count):
+                frame = await run_blocking(next_frame, frames)
+                if frame is None:
+                    break
+                image, key = frame
+                yield event("decoded", {
+                    "frame": index,
+                    "frame_count": count,
+                    "format": fmt,
+                    "width": image.shape[1],
+                    "height": image.shape[0],
+                })
+                async for name, payload in frame_stages(image, key):
+                    if name is None:
+                        responses.append(payload)
+                    else:
+                        yield event(name, {"frame": index, **payload})
+            yield event("done", responses[0] if count == 1 and responses else combine_frames(responses))
+    except Exception as e:
+        yield event("error", {"message": f"An error occurred: {str(e)}"})
 
-        response = {
-            "segmentation_mask_url": f"/static/{seg_filename}",
-            "has_segment": has_segment
-        }
+@app.post("/process/stream")
+async def process_image_stream(
+    file: UploadFile = File(...)
+):
+    """
+    Like ``/process/``, but results stream back as server-sent events as
+    each stage finishes, so the mask can be shown while VGG19 still runs.
+    """
+    data = await file.read()
+    return StreamingResponse(
+        stream_stages(data),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-        if has_segment:
-            # Get bounding box from mask (rescale to original image size)
-            mask_resized = Image.fromarray((prediction * 255).astype(np.uint8)).resize(orig_image.size, resample=Image.NEAREST)
-            mask_np = np.array(mask_resized) / 255.0
-            bbox = get_bounding_box(mask_np)
-            if bbox:
-                # Draw bounding box on original image
-                boxed_image = orig_image.copy()
-                boxed_image = draw_bounding_box(boxed_image, bbox)
-                annotated_filename = f"annotated_{os.path.splitext(file.filename)[0]}.png"
-                annotated_path = os.path.join(STATIC_DIR, annotated_filename)
-                boxed_image.save(annotated_path)
-                response["annotated_image_url"] = f"/static/{annotated_filename}"
-            else:
-                annotated_path = None
-
-            # Run classification prediction
-            prob, pred_class = class_predict(class_model, image_path)
-            label = "Malignant" if pred_class == 1 else "Benign"
-            response["classification"] = {
-                "prediction": label,
-                "probability": round(prob * 100, 2)
-            }
-
-        # Clean up temp files
-        if os.path.exists(temp_input_path):
-            os.remove(temp_input_path)
-        if temp_png_path and os.path.exists(temp_png_path):
-            os.remove(temp_png_path)
+ZIP_MAGIC = b"PK\x03\x04"
 
-        return JSONResponse(content=response)
+def read_entry(archive, info, limit):
+    """
+    Read one ZIP member, or return the error if it is larger than ``limit``
+    bytes or cannot be read. The declared size can be forged, so at most
+    ``limit + 1`` bytes are ever decompressed.
+    """
+    too_large = ValueError(f"Archive entry is larger than {limit} bytes")
+    if info.file_size > limit:
+        return too_large
+    try:
+        with archive.open(info) as member:
+            data = member.read(limit + 1)
     except Exception as e:
-        if os.path.exists(temp_input_path):
-            os.remove(temp_input_path)
-        if temp_png_path and os.path.exists(temp_png_path):
-            os.remove(temp_png_path)
-        return JSONResponse(status_code=500, content={"message": f"An error occurred: {str(e)}"})
+        # Corrupt, encrypted or unsupported entries fail alone, not the batch
+        return e
+    return too_large if len(data) > limit else data
+
+def iter_entries(filename, fileobj):
+    """
+    Yield ``(name, bytes)`` for every image in an upload. ZIP archives are
+    read member by member straight from the upload, without extracting them;
+    an entry over BATCH_MAX_ENTRY_BYTES comes with the error in place of its
+    bytes.
+    """
+    is_zip = fileobj.read(len(ZIP_MAGIC)) == ZIP_MAGIC
+    fileobj.seek(0)
+    if not is_zip:
+        yield filename, fileobj.read()
+        return
+    with zipfile.ZipFile(fileobj) as archive:
+        for info in archive.infolist():
+            if info.is_dir() or os.path.basename(info.filename).startswith("."):
+                continue
+            yield os.path.basename(info.filename), read_entry(archive, info, config.BATCH_MAX_ENTRY_BYTES)
+
+async def process_entry(index, filename, data):
+    try:
+        with metrics.track_request("batch"):
+            if isinstance(data, Exception):
+                raise data
+            response = await run_pipeline(data)
+    except Exception as e:
+        response = {"message": f"An error occurred: {str(e)}"}
+    return {"index": index, "filename": filename, **response}
+
+async def stream_batch(uploads):
+    """
+    Run every image of a batch upload through the pipeline and yield one
+    NDJSON line per image, in completion order. At most
+    BATCH_MAX_IN_FLIGHT images are held in memory at a time.
+    """
+    pending = set()
+    index = 0
+    try:
+        for filename, fileobj in uploads:
+            entries = iter_entries(filename, fileobj)
+            while True:
+                entry = await run_blocking(next, entries, None)
+                if entry is None:
+                    break
+                pending.add(asyncio.create_task(process_entry(index, *entry)))
+                index += 1
+                if len(pending) >= config.BATCH_MAX_IN_FLIGHT:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        yield json.dumps(task.result()) + "\n"
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield json.dumps(task.result()) + "\n"
+    finally:
+        for task in pending:
+            task.cancel()
+        for _, fileobj in uploads:
+            fileobj.close()
+
+@app.post("/process/batch")
+async def process_batch(
+    files: List[UploadFile] = File(...)
+):
+    """
+    Process a list of images and/or ZIP archives of images (e.g. a DICOM
+    study). Results stream back as NDJSON, one line per image as it finishes.
+    """
+    # The upload files are closed once this handler returns, before the
+    # response body streams, so hand their file objects over to the stream.
+    uploads = []
+    for file in files:
+        uploads.append((file.filename, file.file))
+        file.file = BytesIO()
+    return StreamingResponse(stream_batch(uploads), media_type="application/x-ndjson")
+
+@app.get("/startup")
+async def startup_report():
+    return startup_timer.report()
+
+@app.get("/admission")
+async def admission_stats():
+    return admission.stats()
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return inference_cache.stats()
 
 @app.get("/")
 async def root():
     return {"message": "UNet Segmentation and VGG19 Classification API is running."}
 
+@app.get("/memory")
+async def memory():
+    """Resident memory of the worker that serves this request."""
+    try:
+        return memory_usage()
+    except OSError:
+        return JSONResponse(status_code=501, content={"message": "Memory stats are only available on Linux"})
+
+metrics.QUEUE_DEPTH.set_function(lambda: {
+    ("segmentation",): segment_batcher.pending,
+    ("classification",): classify_batcher.pending,
+    ("executor",): executor_backlog(),
+    ("admission_interactive",): admission.queued(INTERACTIVE),
+    ("admission_bulk",): admission.queued(BULK),
+    ("bcrypt",): password_hasher.waiting,
+})
+metrics.CACHE_EVENTS.set_function(lambda: {
+    (event,): value
+    for event, value in inference_cache.stats().items()
+    if event in ("hits", "disk_hits", "misses", "coalesced", "evictions")
+})
+
+metrics.ARTIFACT_BYTES.set_function(lambda: artifact_store.stats()["bytes"])
+metrics.ARTIFACT_EVICTIONS.set_function(lambda: artifact_store.stats()["evictions"])
+
+metrics.PRINCIPAL_CACHE_EVENTS.set_function(lambda: {
+    (event,): value
+    for event, value in principal_cache.stats().items()
+    if event != "entries"
+})
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus text exposition of this worker's metrics."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and the event loop is responsive."""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: models are loaded and warmed up, so traffic can be routed here."""
+    if not getattr(app.state, "ready", False):
+        return JSONResponse(status_code=503, content={"status": "warming_up"})
+    return {"status": "ready"}
+
+startup_timer.mark("app_setup")
+
 if __name__ == "__main__":
     uvicorn.run("app:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
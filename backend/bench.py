@@ -0,0 +1,354 @@
+"""
+Offline benchmark of the inference pipeline and the auth routes.
+
+    python bench.py [--out bench.json] [--baseline old.json] [--tolerance 0.2]
+                    [--sizes 256,512,1024] [--concurrency 1,4,16] [--requests 32]
+
+Needs no network and no real checkpoints: UNet and VGG19Binary get seeded
+random weights, fixtures are synthetic PNG and DICOM images, and requests go
+through an in-process ASGI client against an app running in a scratch
+directory. Measures end-to-end latency and throughput of /process/ at each
+concurrency, mean per-stage latency (from the /metrics histograms), peak
+RSS, and /api/v1/auth/doctor/signin.
+
+Needs the ``bench`` extra for its HTTP client (``uv sync --extra bench``).
+
+Results are written as JSON. Metric names ending in ``_rps`` are better when
+higher, all others when lower. With --baseline, metrics that got worse than
+the baseline by more than --tolerance (relative) are listed and the exit
+status is 1.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", default="bench.json", help="Where to write the results")
+    parser.add_argument("--baseline", help="Earlier results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression")
+    parser.add_argument("--sizes", default="256,512,1024", help="Fixture resolutions (square)")
+    parser.add_argument("--concurrency", default="1,4,16", help="Concurrent clients per load run")
+    parser.add_argument("--requests", type=int, default=32, help="Requests per load run")
+    parser.add_argument("--dicom-frames", type=int, default=4, help="Frames of the multi-frame DICOM fixture")
+    parser.add_argument("--auth-requests", type=int, default=8, help="Signin requests per load run")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def prepare_environment(workdir, seed, concurrency):
+    """
+    Write seeded random checkpoints and point the app's configuration at the
+    scratch directory, with room for ``concurrency`` requests at once. Must
+    run before config (or anything importing it) is imported.
+    """
+    os.environ.update({
+        "SEG_MODEL_PATH": os.path.join(workdir, "unet.pth"),
+        "CLASS_MODEL_PATH": os.path.join(workdir, "vgg19.pth"),
+        # Every request must run the models, not hit the result cache
+        "CACHE_MAX_BYTES": "0",
+        "CACHE_DIR": "",
+        # Every in-process request comes from the same client address; the
+        # runs measure inference, not admission control
+        "ADMISSION_PER_CLIENT": "0",
+        "ADMISSION_MAX_QUEUED": str(concurrency),
+        "ARTIFACT_DIR": os.path.join(workdir, "static"),
+        "TEMP_DIR": os.path.join(workdir, "tmp"),
+        "JOB_DIR": os.path.join(workdir, "jobs"),
+    })
+    import torch
+    sys.path.insert(0, BACKEND_DIR)
+    from inference.networks import UNet, VGG19Binary
+
+    torch.manual_seed(seed)
+    unet = UNet(n_channels=3, n_classes=1)
+    # Random weights give empty masks; a positive output bias makes every mask
+    # a lesion, so classification, box finding and annotation run as well
+    with torch.no_grad():
+        unet.outc.conv.bias.fill_(5.0)
+    torch.save(unet.state_dict(), os.environ["SEG_MODEL_PATH"])
+    torch.save(VGG19Binary().state_dict(), os.environ["CLASS_MODEL_PATH"])
+    # The app keeps its SQLite database in the working directory
+    os.chdir(workdir)
+
+
+def synthetic_image(size, seed):
+    """A smooth RGB image, closer to a scan than white noise."""
+    from PIL import Image, ImageFilter
+    rng = np.random.default_rng(seed)
+    coarse = rng.integers(0, 256, (max(size // 8, 1), max(size // 8, 1), 3), dtype=np.uint8)
+    image = Image.fromarray(coarse).resize((size, size), Image.BICUBIC).filter(ImageFilter.GaussianBlur(2))
+    return np.array(image)
+
+
+def png_variants(size, count, seed):
+    """``count`` PNGs of one image, each with a different first pixel so none share a cache key."""
+    from PIL import Image
+    image = synthetic_image(size, seed)
+    variants = []
+    for i in range(count):
+        image[0, 0] = (i % 256, i // 256 % 256, 255)
+        buffer = io.BytesIO()
+        Image.fromarray(image).save(buffer, format="PNG")
+        variants.append(buffer.getvalue())
+    return variants
+
+
+def dicom_variants(size, count, seed, frames=1):
+    """``count`` 12-bit MONOCHROME2 DICOM files with a VOI window, ``frames`` frames each."""
+    from pydicom.dataset import Dataset, FileMetaDataset
+    from pydicom.uid import ExplicitVRLittleEndian, SecondaryCaptureImageStorage, generate_uid
+    rng = np.random.default_rng(seed)
+    base = synthetic_image(size, seed)[..., 0].astype(np.uint16) * 16
+    variants = []
+    for i in range(count):
+        pixels = np.stack([np.roll(base, j, axis=1) for j in range(frames)])
+        pixels[:, 0, 0] = i
+        ds = Dataset()
+        ds.file_meta = FileMetaDataset()
+        ds.file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+        ds.file_meta.MediaStorageSOPClassUID = SecondaryCaptureImageStorage
+        ds.file_meta.MediaStorageSOPInstanceUID = generate_uid(entropy_srcs=[str(seed), str(i)])
+        ds.SOPClassUID = ds.file_meta.MediaStorageSOPClassUID
+        ds.SOPInstanceUID = ds.file_meta.MediaStorageSOPInstanceUID
+        ds.Rows, ds.Columns = size, size
+        ds.SamplesPerPixel = 1
+        ds.PhotometricInterpretation = "MONOCHROME2"
+        ds.BitsAllocated, ds.BitsStored, ds.HighBit = 16, 12, 11
+        ds.PixelRepresentation = 0
+        ds.WindowCenter, ds.WindowWidth = int(rng.integers(1500, 2500)), 2000
+        if frames > 1:
+            ds.NumberOfFrames = frames
+        ds.PixelData = (pixels if frames > 1 else pixels[0]).tobytes()
+        buffer = io.BytesIO()
+        ds.save_as(buffer, enforce_file_format=True)
+        variants.append(buffer.getvalue())
+    return variants
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def run_load(send, payloads, concurrency):
+    """
+    Send every payload with ``concurrency`` clients; returns latency stats and
+    throughput. Raises if any request fails, since rejected requests would
+    skew both.
+    """
+    latencies = []
+    failures = []
+    queue = list(reversed(payloads))
+
+    async def client():
+        while queue:
+            payload = queue.pop()
+            start = time.perf_counter()
+            response = await send(payload)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                failures.append(response)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    if failures:
+        response = failures[0]
+        raise RuntimeError(
+            f"{len(failures)} of {len(payloads)} requests failed, "
+            f"first with {response.status_code}: {response.text}"
+        )
+    return {
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "throughput_rps": len(latencies) / elapsed,
+    }
+
+
+def histogram_totals(histogram):
+    """``{label: (sum, count)}`` of a metrics histogram with a single label."""
+    return {values[0]: totals for values, totals in histogram.collect().items()}
+
+
+def mean_ms_since(histogram, before):
+    means = {}
+    for label, (total, count) in histogram_totals(histogram).items():
+        old_total, old_count = before.get(label, (0.0, 0))
+        if count > old_count:
+            means[label] = (total - old_total) / (count - old_count) * 1000
+    return means
+
+
+async def bench_process(client, fixtures, concurrency_levels):
+    import metrics
+    results = {}
+    async def send(data):
+        return await client.post("/process/", files={"file": ("fixture", data)})
+
+    for name, payloads in fixtures.items():
+        # Untimed, so lazy imports (pydicom) don't land in the first run
+        await send(payloads[0])
+        for concurrency in concurrency_levels:
+            stages = histogram_totals(metrics.STAGE_SECONDS)
+            decode = histogram_totals(metrics.DECODE_SECONDS)
+            run = await run_load(send, payloads, concurrency)
+            run["stage_mean_ms"] = mean_ms_since(metrics.STAGE_SECONDS, stages)
+            run["decode_mean_ms"] = mean_ms_since(metrics.DECODE_SECONDS, decode)
+            run["peak_rss_mb"] = peak_rss_mb()
+            results[f"process.{name}.c{concurrency}"] = run
+            print(f"process {name:<14} c={concurrency:<3} p50 {run['p50_ms']:8.1f} ms  "
+                  f"p95 {run['p95_ms']:8.1f} ms  {run['throughput_rps']:7.2f} req/s")
+    return results
+
+
+async def bench_auth(client, requests, concurrency_levels):
+    import metrics
+    credentials = {"email": "bench@example.com", "password": "bench-password"}
+    response = await client.post("/api/v1/auth/doctor/signup", json={
+        **credentials, "name": "Bench", "specialization": "Radiology",
+    })
+    if response.status_code >= 400:
+        raise RuntimeError(f"Could not create the benchmark doctor: {response.text}")
+
+    results = {}
+    for concurrency in concurrency_levels:
+        db = histogram_totals(metrics.AUTH_DB_SECONDS)
+        bcrypt = histogram_totals(metrics.AUTH_BCRYPT_SECONDS)
+        bcrypt_queue = histogram_totals(metrics.AUTH_BCRYPT_QUEUE_SECONDS)
+
+        async def send(_):
+            return await client.post("/api/v1/auth/doctor/signin", json=credentials)
+
+        run = await run_load(send, [None] * requests, concurrency)
+        run["db_mean_ms"] = mean_ms_since(metrics.AUTH_DB_SECONDS, db)
+        run["bcrypt_mean_ms"] = mean_ms_since(metrics.AUTH_BCRYPT_SECONDS, bcrypt)
+        run["bcrypt_queue_mean_ms"] = mean_ms_since(metrics.AUTH_BCRYPT_QUEUE_SECONDS, bcrypt_queue)
+        results[f"signin.c{concurrency}"] = run
+        print(f"signin {'':<15} c={concurrency:<3} p50 {run['p50_ms']:8.1f} ms  "
+              f"p95 {run['p95_ms']:8.1f} ms  {run['throughput_rps']:7.2f} req/s")
+    return results
+
+
+def flatten(results, prefix=""):
+    """Flatten nested results into ``{"a.b.c": number}``."""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)):
+            flat[name] = value
+    return flat
+
+
+def compare(results, baseline, tolerance):
+    """Return ``(name, baseline, current, change)`` for every metric that regressed."""
+    current, previous = flatten(results), flatten(baseline)
+    regressions = []
+    for name, value in current.items():
+        old = previous.get(name)
+        if not old:
+            continue
+        change = (value - old) / old
+        worse = -change if name.endswith("_rps") else change
+        if worse > tolerance:
+            regressions.append((name, old, value, change))
+    return regressions
+
+
+async def run(args):
+    import torch
+    import app
+    import config
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    concurrency_levels = [int(level) for level in args.concurrency.split(",")]
+    print("Generating fixtures")
+    fixtures = {}
+    for i, size in enumerate(sizes):
+        fixtures[f"png_{size}"] = png_variants(size, args.requests, args.seed + i)
+        fixtures[f"dicom_{size}"] = dicom_variants(size, args.requests, args.seed + i)
+    if args.dicom_frames > 1:
+        size = sizes[len(sizes) // 2]
+        fixtures[f"dicom_{size}x{args.dicom_frames}"] = dicom_variants(
+            size, max(args.requests // args.dicom_frames, 1), args.seed, frames=args.dicom_frames
+        )
+
+    import httpx
+    async with app.app.router.lifespan_context(app.app):
+        startup_ms = app.startup_timer.report()["total_ms"]
+        while not getattr(app.app.state, "ready", False):
+            await asyncio.sleep(0.05)
+        transport = httpx.ASGITransport(app=app.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            process = await bench_process(client, fixtures, concurrency_levels)
+            auth = await bench_auth(client, args.auth_requests, concurrency_levels[:2])
+
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "backend": config.INFERENCE_BACKEND,
+            "precision": config.INFERENCE_PRECISION,
+            "max_batch_size": config.MAX_BATCH_SIZE,
+            "inference_workers": config.INFERENCE_WORKERS,
+            "seed": args.seed,
+            "requests": args.requests,
+        },
+        "results": {
+            "startup_ms": startup_ms,
+            **process,
+            **auth,
+            "peak_rss_mb": peak_rss_mb(),
+        },
+    }
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    out = os.path.abspath(args.out)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    with tempfile.TemporaryDirectory(prefix="bench-") as workdir:
+        concurrency = max(int(level) for level in args.concurrency.split(","))
+        prepare_environment(workdir, args.seed, concurrency)
+        report = asyncio.run(run(args))
+        os.chdir(BACKEND_DIR)
+
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {out}")
+
+    if baseline is not None:
+        regressions = compare(report["results"], baseline["results"], args.tolerance)
+        for name, old, value, change in regressions:
+            print(f"REGRESSION {name}: {old:.2f} -> {value:.2f} ({change:+.0%})")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,88 @@
 from sqlmodel import SQLModel, create_engine, Session 
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import event, inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from fastapi import Depends
 from typing import Annotated
+import config
 
-engine = create_engine("sqlite:///database.db")
+# Async drivers for the backends DATABASE_URL may point at
+ASYNC_DRIVERS = {
+  "sqlite": "sqlite+aiosqlite",
+  "postgresql": "postgresql+asyncpg",
+}
+
+def async_url(url):
+  url = make_url(url)
+  return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+
+def is_sqlite(url):
+  return make_url(url).get_backend_name() == "sqlite"
+
+def pool_options(url, poolclass):
+  url = make_url(url)
+  if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+    # An in-memory database lives in its single connection
+    return {}
+  return {
+    "poolclass": poolclass,
+    "pool_size": config.DB_POOL_SIZE,
+    "max_overflow": config.DB_MAX_OVERFLOW,
+    "pool_timeout": config.DB_POOL_TIMEOUT,
+    "pool_pre_ping": not is_sqlite(url),
+  }
+
+def set_sqlite_pragmas(dbapi_connection, _connection_record):
+  # WAL lets readers run alongside the single writer, and NORMAL only syncs
+  # at checkpoints, which is still safe against corruption in WAL mode
+  cursor = dbapi_connection.cursor()
+  cursor.execute("PRAGMA journal_mode=WAL")
+  cursor.execute("PRAGMA synchronous=NORMAL")
+  cursor.execute(f"PRAGMA busy_timeout={config.DB_BUSY_TIMEOUT_MS}")
+  cursor.execute(f"PRAGMA mmap_size={config.DB_MMAP_SIZE}")
+  cursor.close()
+
+engine = create_engine(config.DATABASE_URL, **pool_options(config.DATABASE_URL, QueuePool))
+async_engine = create_async_engine(
+  async_url(config.DATABASE_URL),
+  **pool_options(config.DATABASE_URL, AsyncAdaptedQueuePool),
+)
+if is_sqlite(config.DATABASE_URL):
+  event.listen(engine, "connect", set_sqlite_pragmas)
+  event.listen(async_engine.sync_engine, "connect", set_sqlite_pragmas)
+
+def add_missing_columns(connection, table):
+  # New columns are nullable, so they can be added without rewriting the table
+  existing = {column["name"] for column in inspect(connection).get_columns(table.name)}
+  for column in table.columns:
+    if column.name not in existing:
+      column_type = column.type.compile(connection.dialect)
+      connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
 
 def create_db_and_table():
   SQLModel.metadata.create_all(engine)
+  # create_all skips tables that already exist, along with their new
+  # columns and indexes
+  with engine.begin() as connection:
+    for table in SQLModel.metadata.sorted_tables:
+      add_missing_columns(connection, table)
+      for index in table.indexes:
+        index.create(connection, checkfirst=True)
 
 def get_session():
   with Session(engine) as session:
     yield session
 
-SessionType = Annotated[Session, Depends(get_session)]
\ No newline at end of file
+async def get_async_session():
+  # Objects stay readable after commit without another round trip
+  async with AsyncSession(async_engine, expire_on_commit=False) as session:
+    yield session
+
+async def dispose_engines():
+  engine.dispose()
+  await async_engine.dispose()
+
+SessionType = Annotated[Session, Depends(get_session)]
+AsyncSessionType = Annotated[AsyncSession, Depends(get_async_session)]
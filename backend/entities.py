@@ -1,6 +1,8 @@
 from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy import JSON, Index, LargeBinary
 from typing import Optional, List
 from datetime import datetime
+from uuid import uuid4
 
 class Doctor(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True,)
@@ -17,13 +19,66 @@ class Patient(SQLModel, table=True):
     gender: str
     contact: str
     email: str = Field(index=True, nullable=False, unique=True)
-    reports: List["Report"] = Relationship(back_populates="patient")
+    # Newest first, in the order of the patient's history index
+    reports: List["Report"] = Relationship(
+        back_populates="patient",
+        sa_relationship_kwargs={"order_by": "(Report.date_created.desc(), Report.id.desc())"},
+    )
 
 class Report(SQLModel, table=True):
+    __table_args__ = (
+        # Keyset pagination in creation order
+        Index("ix_report_date_created_id", "date_created", "id"),
+        # A patient's history in one range scan
+        Index("ix_report_patient_date", "patient_id", "date_created", "id"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     patient_id: int = Field(foreign_key="patient.id")
     diagnosis: str
     treatment: str
     date_created: datetime = Field(default_factory=datetime.utcnow)
+    # Inference results; every column added after the first release is
+    # nullable so existing databases can be upgraded in place
+    frame: Optional[int] = None
+    has_segment: Optional[bool] = None
+    prediction: Optional[str] = None
+    # P(malignant), from 0 to 1 (not the probability of ``prediction``)
+    probability: Optional[float] = None
+    lesion_count: Optional[int] = None
+    bbox_x_min: Optional[int] = None
+    bbox_y_min: Optional[int] = None
+    bbox_x_max: Optional[int] = None
+    bbox_y_max: Optional[int] = None
+    lesions: Optional[List[dict]] = Field(default=None, sa_type=JSON)
+    # Low-resolution mask, see inference.artifacts.pack_mask
+    mask: Optional[bytes] = Field(default=None, sa_type=LargeBinary)
+    mask_height: Optional[int] = None
+    mask_width: Optional[int] = None
+    annotated_image_url: Optional[str] = None
 
     patient: Optional[Patient] = Relationship(back_populates="reports")
+
+class ArtifactPin(SQLModel, table=True):
+    # Artifacts referenced by stored reports, exempt from GC; job results are
+    # not pinned and follow the artifact TTL like /process/ responses
+    digest: str = Field(primary_key=True)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class InferenceJob(SQLModel, table=True):
+    # Workers claim the highest-priority, oldest queued job first
+    __table_args__ = (Index("ix_inferencejob_claim", "status", "priority", "created_at"),)
+
+    id: str = Field(default_factory=lambda: uuid4().hex, primary_key=True)
+    filename: str
+    input_path: str
+    priority: int = 0
+    status: str = "queued"
+    attempts: int = 0
+    result: Optional[str] = None
+    error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    # Renewed while a worker runs the job; the claim lapses when it goes stale
+    heartbeat_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
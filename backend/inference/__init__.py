@@ -0,0 +1,2 @@
+from .batching import MicroBatcher
+from .executor import get_executor, run_blocking, shutdown_executor
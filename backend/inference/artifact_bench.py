@@ -0,0 +1,85 @@
+"""
+Compare result-artifact encoders by bytes written and encode time.
+
+    python -m inference.artifact_bench [--images DIR] [--quality 85] [--repeat 20]
+
+Masks are encoded with the former matplotlib ``imsave`` path (when
+matplotlib is installed), as 1-bit PNG and as RLE JSON; annotated images as
+default PNG, WebP and JPEG. Runs on the images in DIR (or seeded synthetic
+ones) and prints mean bytes and milliseconds per image for each encoder.
+"""
+import argparse
+import json
+import time
+from io import BytesIO
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from .artifacts import encode_image, encode_mask_png, mask_to_rle, rle_to_mask
+from .parity import load_fixtures
+
+
+def synthetic_mask(image, size=128):
+    """A blob-shaped 128x128 mask, roughly what the UNet produces."""
+    mask = Image.new("L", (size, size))
+    draw = ImageDraw.Draw(mask)
+    seed = int(image[::17, ::17].sum()) % 64
+    draw.ellipse([20 + seed // 2, 30, 80 + seed, 90 + seed // 4], fill=1)
+    draw.ellipse([90, 10, 110, 40], fill=1)
+    return np.array(mask)
+
+
+def encode_mask_matplotlib(mask):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    buffer = BytesIO()
+    plt.imsave(buffer, mask, cmap="gray", format="png")
+    return buffer.getvalue()
+
+
+def measure(encode, items, repeat):
+    sizes = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        sizes = [len(encode(item)) for item in items]
+    elapsed = (time.perf_counter() - start) / (repeat * len(items))
+    return sum(sizes) / len(sizes), elapsed * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", help="Directory of images (PNG/JPEG/DICOM)")
+    parser.add_argument("--quality", type=int, default=85, help="WebP/JPEG quality")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    images = load_fixtures(args.images)
+    masks = [synthetic_mask(image) for image in images]
+    for mask in masks:
+        assert (rle_to_mask(mask_to_rle(mask)) == mask).all()
+    annotated = [Image.fromarray(image) for image in images]
+
+    mask_encoders = {
+        "1-bit png": encode_mask_png,
+        "rle json": lambda mask: json.dumps(mask_to_rle(mask)).encode(),
+    }
+    try:
+        encode_mask_matplotlib(masks[0])
+        mask_encoders = {"matplotlib png": encode_mask_matplotlib, **mask_encoders}
+    except ImportError:
+        print("matplotlib is not installed, skipping the former mask encoder")
+    image_encoders = {
+        fmt: lambda image, fmt=fmt: encode_image(image, fmt, args.quality)[0] for fmt in ("png", "webp", "jpeg")
+    }
+
+    print(f"{len(images)} images, mean per image")
+    for title, encoders, items in (("mask", mask_encoders, masks), ("annotated", image_encoders, annotated)):
+        for name, encode in encoders.items():
+            size, ms = measure(encode, items, args.repeat)
+            print(f"{title:>9} {name:<15} {size:>10.0f} bytes {ms:>8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
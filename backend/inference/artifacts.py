@@ -0,0 +1,86 @@
+import base64
+import zlib
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+MASK_FORMATS = ("png", "rle")
+# format: (PIL format, file extension, media type)
+IMAGE_FORMATS = {
+    "png": ("PNG", "png", "image/png"),
+    "webp": ("WEBP", "webp", "image/webp"),
+    "jpeg": ("JPEG", "jpg", "image/jpeg"),
+}
+
+
+def encode_mask_png(mask):
+    """Encode a binary mask as a 1-bit grayscale PNG."""
+    buffer = BytesIO()
+    Image.fromarray(np.asarray(mask) > 0.5).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def mask_to_rle(mask):
+    """
+    Run-length encode a binary mask in row-major order.
+    ``counts`` alternates background and foreground runs, starting with
+    background (so it starts with 0 when the first pixel is foreground).
+    """
+    flat = np.asarray(mask).reshape(-1) > 0.5
+    changes = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+    counts = np.diff(np.concatenate(([0], changes, [flat.size])))
+    if flat.size and flat[0]:
+        counts = np.concatenate(([0], counts))
+    return {"size": list(np.shape(mask)), "counts": counts.tolist()}
+
+
+def rle_to_mask(rle):
+    """Inverse of ``mask_to_rle``, returns a uint8 mask."""
+    counts = np.asarray(rle["counts"], dtype=np.int64)
+    values = (np.arange(len(counts)) % 2).astype(np.uint8)
+    return np.repeat(values, counts).reshape(rle["size"])
+
+
+def pack_mask(mask):
+    """
+    Compact binary form of a mask for database storage: one bit per pixel,
+    row-major, deflated. Store the mask's shape alongside it.
+    """
+    return zlib.compress(np.packbits(np.asarray(mask).reshape(-1) > 0.5).tobytes())
+
+
+def unpack_mask(data, shape):
+    """Inverse of ``pack_mask``, returns a uint8 mask of ``shape``."""
+    bits = np.frombuffer(zlib.decompress(data), dtype=np.uint8)
+    return np.unpackbits(bits, count=int(np.prod(shape))).reshape(shape)
+
+
+def check_formats(mask_format, image_format):
+    """Raise ``ValueError`` unless both artifact formats can be produced here."""
+    if mask_format not in MASK_FORMATS:
+        raise ValueError(f"Unknown mask format '{mask_format}', expected one of {', '.join(MASK_FORMATS)}")
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f"Unknown image format '{image_format}', expected one of {', '.join(IMAGE_FORMATS)}")
+    # Encoders are optional in Pillow builds (webp needs libwebp)
+    Image.init()
+    if IMAGE_FORMATS[image_format][0] not in Image.SAVE:
+        raise ValueError(f"This Pillow build cannot encode '{image_format}' images")
+
+
+def encode_image(image, fmt="webp", quality=85):
+    """
+    Encode a PIL image as ``fmt`` (png, webp or jpeg); ``quality`` applies to
+    the lossy formats. Returns the bytes, file extension and media type.
+    """
+    if fmt not in IMAGE_FORMATS:
+        raise ValueError(f"Unknown image format '{fmt}', expected one of {', '.join(IMAGE_FORMATS)}")
+    pil_format, extension, media_type = IMAGE_FORMATS[fmt]
+    options = {} if fmt == "png" else {"quality": quality}
+    buffer = BytesIO()
+    image.convert("RGB").save(buffer, format=pil_format, **options)
+    return buffer.getvalue(), extension, media_type
+
+
+def to_base64(data):
+    return base64.b64encode(data).decode("ascii")
@@ -0,0 +1,181 @@
+import os
+
+import torch
+
+import config
+from .networks import UNet, VGG19Binary
+from .precision import apply_precision, effective_precision
+
+# Input sizes the networks are trained on, used to trace and export them
+SEG_INPUT_SIZE = 128
+CLASS_INPUT_SIZE = 224
+
+
+def default_device():
+    return torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+
+def load_checkpoint(build, path, device):
+    """
+    Build a network without initializing its weights and attach a checkpoint.
+
+    The module is created on the meta device, so no random initialization
+    runs, and the checkpoint is memory-mapped, so its tensors are paged in
+    from the file on demand instead of being read and copied up front.
+    Raises FileNotFoundError when the checkpoint is missing.
+    """
+    try:
+        state_dict = torch.load(path, map_location="cpu", mmap=True, weights_only=True)
+    except RuntimeError:
+        # Checkpoints in the legacy (non-zip) format can't be memory-mapped
+        state_dict = torch.load(path, map_location="cpu", weights_only=True)
+    with torch.device("meta"):
+        model = build()
+    model.load_state_dict(state_dict, assign=True)
+    return model.to(device).eval()
+
+
+def load_models(device, seg_model_path=None, class_model_path=None):
+    """
+    Build UNet and VGG19Binary and load their checkpoints.
+    Raises FileNotFoundError when a checkpoint is missing.
+    """
+    seg_model = load_checkpoint(
+        lambda: UNet(n_channels=3, n_classes=1), seg_model_path or config.SEG_MODEL_PATH, device
+    )
+    class_model = load_checkpoint(VGG19Binary, class_model_path or config.CLASS_MODEL_PATH, device)
+    return seg_model, class_model
+
+
+class InferenceBackend:
+    """
+    Runs the segmentation and classification networks on preprocessed batches.
+
+    Both methods take a float32 (N, 3, H, W) CPU tensor. ``segment`` returns
+    the UNet logits as (N, 1, H, W) and ``classify`` returns the VGG19Binary
+    probabilities as (N, 1), both on the CPU.
+    """
+    name = None
+
+    def segment(self, batch):
+        raise NotImplementedError
+
+    def classify(self, batch):
+        raise NotImplementedError
+
+
+class EagerBackend(InferenceBackend):
+    """Plain PyTorch modules, the reference for every other backend."""
+    name = "eager"
+
+    def __init__(self, seg_model, class_model, device):
+        self.seg_model = seg_model
+        self.class_model = class_model
+        self.device = device
+
+    def _run(self, model, batch):
+        with torch.inference_mode():
+            return model(batch.to(self.device)).cpu()
+
+    def segment(self, batch):
+        return self._run(self.seg_model, batch)
+
+    def classify(self, batch):
+        return self._run(self.class_model, batch)
+
+
+class TorchScriptBackend(EagerBackend):
+    """
+    Removes Python dispatch overhead from the eager modules.
+    ``mode="torchscript"`` traces and freezes each network; ``mode="compile"``
+    wraps them with ``torch.compile`` instead.
+    """
+    def __init__(self, seg_model, class_model, device, mode="torchscript"):
+        self.name = mode
+        if mode == "compile":
+            seg_model = torch.compile(seg_model)
+            class_model = torch.compile(class_model)
+        else:
+            seg_model = self._script(seg_model, SEG_INPUT_SIZE, device)
+            class_model = self._script(class_model, CLASS_INPUT_SIZE, device)
+        super().__init__(seg_model, class_model, device)
+
+    @staticmethod
+    def _script(model, size, device):
+        if isinstance(model, torch.jit.ScriptModule):
+            # Statically quantized models are already saved as TorchScript
+            return model
+        example = torch.zeros(1, 3, size, size, device=device)
+        with torch.no_grad():
+            traced = torch.jit.trace(model, example)
+        return torch.jit.optimize_for_inference(torch.jit.freeze(traced))
+
+
+class OnnxBackend(InferenceBackend):
+    """Runs the exported ONNX graphs with ONNX Runtime on the CPU."""
+    name = "onnx"
+
+    def __init__(self, seg_model_path, class_model_path, num_threads=None):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise RuntimeError("INFERENCE_BACKEND=onnx requires the 'onnxruntime' package")
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        providers = ["CPUExecutionProvider"]
+        self.seg_session = ort.InferenceSession(seg_model_path, options, providers=providers)
+        self.class_session = ort.InferenceSession(class_model_path, options, providers=providers)
+
+    @staticmethod
+    def _run(session, batch):
+        inputs = {session.get_inputs()[0].name: batch.contiguous().numpy()}
+        return torch.from_numpy(session.run(None, inputs)[0])
+
+    def segment(self, batch):
+        return self._run(self.seg_session, batch)
+
+    def classify(self, batch):
+        return self._run(self.class_session, batch)
+
+
+BACKENDS = ("eager", "torchscript", "compile", "onnx")
+
+
+def create_backend(name=None, device=None, precision=None):
+    """
+    Load the models for the backend selected by ``name`` (default:
+    config.INFERENCE_BACKEND) at ``precision`` (default:
+    config.INFERENCE_PRECISION). Precision modes apply to the PyTorch backends
+    only and always run on the CPU; ONNX graphs are served as exported.
+    """
+    name = name or config.INFERENCE_BACKEND
+    precision = precision or config.INFERENCE_PRECISION
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{name}', expected one of {', '.join(BACKENDS)}")
+    if name == "onnx":
+        precision = "fp32"
+        weight_files = (config.ONNX_SEG_MODEL_PATH, config.ONNX_CLASS_MODEL_PATH)
+        for path in weight_files:
+            if not os.path.exists(path):
+                raise FileNotFoundError(2, "No such file", path)
+        backend = OnnxBackend(*weight_files, num_threads=config.TORCH_NUM_THREADS)
+    else:
+        # Reported as served, so bf16 without CPU support is versioned as fp32
+        precision = effective_precision(precision)
+        weight_files = (config.SEG_MODEL_PATH, config.CLASS_MODEL_PATH)
+        if precision == "int8-static":
+            weight_files = (config.INT8_SEG_MODEL_PATH, config.INT8_CLASS_MODEL_PATH)
+        if precision != "fp32":
+            device = torch.device("cpu")
+        device = device or default_device()
+        seg_model, class_model = (None, None) if precision == "int8-static" else load_models(device)
+        seg_model, class_model = apply_precision(seg_model, class_model, precision)
+        if name == "eager":
+            backend = EagerBackend(seg_model, class_model, device)
+        else:
+            backend = TorchScriptBackend(seg_model, class_model, device, mode=name)
+    # What the results depend on, used to version cached results
+    backend.weight_files = weight_files
+    backend.precision = precision
+    return backend
@@ -0,0 +1,95 @@
+import asyncio
+import itertools
+
+from .executor import run_blocking
+
+
+class MicroBatcher:
+    """Gather concurrent requests into batches for a single forward pass.
+
+    ``process_batch`` receives a list of submitted items and must return a
+    list of results in the same order. It runs on the CPU-bound executor, so
+    the event loop keeps serving other routes while a batch is in flight.
+    A batch is flushed as soon as it holds ``max_batch_size`` items or its
+    oldest item has waited ``max_wait_ms``, so the extra latency added to any
+    request is bounded by ``max_wait_ms``. Waiting items are batched lowest
+    ``priority`` first, then in submission order.
+    """
+    def __init__(self, process_batch, max_batch_size=8, max_wait_ms=10.0):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = None
+        self._worker = None
+        self._sequence = itertools.count()
+
+    @property
+    def pending(self):
+        """Number of submitted items not yet picked up by a batch."""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def start(self):
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.PriorityQueue()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        while not self._queue.empty():
+            *_, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Inference batcher stopped"))
+
+    async def submit(self, item, priority=0):
+        """Queue ``item`` for the next batch and wait for its own result."""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        # The sequence number keeps equal priorities FIFO and is never tied
+        await self._queue.put((priority, next(self._sequence), item, future))
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        # Callers that gave up (client disconnect, timeout) don't need a slot.
+        return [(item, future) for _, _, item, future in batch if not future.done()]
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            if batch:
+                await self._dispatch(batch)
+
+    async def _dispatch(self, batch):
+        items = [item for item, _ in batch]
+        try:
+            results = await run_blocking(self.process_batch, items)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
@@ -0,0 +1,187 @@
+import asyncio
+import hashlib
+import os
+import time
+from collections import Counter, OrderedDict
+
+import numpy as np
+
+from .executor import run_blocking
+
+# Rough per-entry bookkeeping cost on top of the mask bytes
+ENTRY_OVERHEAD = 256
+
+
+def weights_version(*paths):
+    """Identify a set of checkpoint files by path, size and mtime, without reading them."""
+    digest = hashlib.blake2b(digest_size=8)
+    for path in paths:
+        stat = os.stat(path)
+        digest.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return digest.hexdigest()
+
+
+def image_key(image, model_version):
+    """Content hash of a decoded image plus the version of the models that saw it."""
+    image = np.ascontiguousarray(image)
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(model_version.encode())
+    digest.update(f"{image.shape}{image.dtype}".encode())
+    digest.update(memoryview(image).cast("B"))
+    return digest.hexdigest()
+
+
+class InferenceCache:
+    """
+    Content-addressed cache of inference results.
+
+    Values are dicts holding the ``mask`` (uint8 array), ``bbox``,
+    ``lesions`` and ``classification`` of one image. The in-memory tier is an LRU bounded by
+    ``max_bytes`` with entries expiring after ``ttl`` seconds; when
+    ``disk_dir`` is set, results are also persisted there as ``.npz`` files
+    and survive restarts. Concurrent lookups of a key that is still being
+    computed wait for that single computation instead of starting another;
+    it is only cancelled once every caller waiting on it has been.
+    """
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl=None, disk_dir=None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._inflight = {}
+        self._waiting = Counter()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, size, expires_at = entry
+        if expires_at is not None and expires_at < time.monotonic():
+            self._discard(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        size = value["mask"].nbytes + ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._discard(key)
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        self._entries[key] = (value, size, expires_at)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._discard(oldest)
+            self.evictions += 1
+
+    def _discard(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], f"{key}.npz")
+
+    def _read_disk(self, key):
+        path = self._disk_path(key)
+        try:
+            if self.ttl and os.path.getmtime(path) + self.ttl < time.time():
+                os.remove(path)
+                return None
+            with np.load(path) as data:
+                bbox = tuple(int(v) for v in data["bbox"]) or None
+                lesions = [{"bbox": [int(v) for v in row[:4]], "area": int(row[4])} for row in data["lesions"]]
+                classification = data["classification"]
+                return {
+                    "mask": data["mask"],
+                    "bbox": bbox,
+                    "lesions": lesions,
+                    "classification": (float(classification[0]), int(classification[1])) if classification.size else None,
+                }
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def _write_disk(self, key, value):
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                np.savez(
+                    f,
+                    mask=value["mask"],
+                    bbox=np.array(value["bbox"] or (), dtype=np.int64),
+                    lesions=np.array(
+                        [[*lesion["bbox"], lesion["area"]] for lesion in value["lesions"]], dtype=np.int64
+                    ).reshape(-1, 5),
+                    classification=np.array(value["classification"] or (), dtype=np.float64),
+                )
+            os.replace(tmp_path, path)
+        except OSError as e:
+            # The disk tier is best effort; the result is still served from memory
+            print(f"Warning: could not write inference cache entry '{path}': {e}")
+
+    async def get_or_compute(self, key, compute):
+        """Return the cached value for ``key``, or await ``compute()`` once to produce it."""
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            # The computation runs on its own, so a caller giving up doesn't
+            # cancel it for the others waiting on the same key
+            task = asyncio.create_task(self._compute(key, compute))
+            task.add_done_callback(lambda done: self._settle(key, done))
+            self._inflight[key] = task
+        self._waiting[task] += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._waiting[task] -= 1
+            if not self._waiting[task]:
+                del self._waiting[task]
+                if not task.done():
+                    # Nobody wants the result anymore; later lookups start over
+                    self._settle(key, task)
+                    task.cancel()
+
+    def _settle(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    async def _compute(self, key, compute):
+        value = await run_blocking(self._read_disk, key) if self.disk_dir else None
+        if value is not None:
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            value = await compute()
+            if self.disk_dir:
+                await run_blocking(self._write_disk, key, value)
+        self.put(key, value)
+        return value
@@ -0,0 +1,99 @@
+"""
+Build the reduced-precision models and report their parity with fp32.
+
+    python -m inference.calibrate [--images DIR] [--mode MODE ...] [--report PATH]
+
+For int8-static, activation ranges are calibrated on the fixture images and
+the quantized networks are written to INT8_SEG_MODEL_PATH and
+INT8_CLASS_MODEL_PATH. Every mode is then compared with fp32 on the same
+fixtures: mask disagreement, probability difference, model size and
+latency. The report is printed and optionally written as JSON.
+"""
+import argparse
+import json
+import statistics
+import time
+
+import torch
+
+import config
+from .backends import CLASS_INPUT_SIZE, SEG_INPUT_SIZE, EagerBackend, load_models
+from .parity import compare, load_fixtures
+from .precision import PRECISIONS, apply_precision, model_size_bytes, quantize_static, save_quantized
+from .predict import class_transform, seg_transform, to_image_tensor
+
+
+def calibrate_static(images, batch_size=4):
+    """Quantize both networks with FX static INT8 and save them as TorchScript."""
+    seg_model, class_model = load_models(torch.device("cpu"))
+    seg_batches, class_batches = [], []
+    for i in range(0, len(images), batch_size):
+        chunk = [to_image_tensor(image) for image in images[i:i + batch_size]]
+        seg_batches.append(torch.stack([seg_transform(t) for t in chunk]))
+        class_batches.append(torch.stack([class_transform(t) for t in chunk]))
+    save_quantized(quantize_static(seg_model, seg_batches), torch.zeros(1, 3, SEG_INPUT_SIZE, SEG_INPUT_SIZE), config.INT8_SEG_MODEL_PATH)
+    save_quantized(quantize_static(class_model, class_batches), torch.zeros(1, 3, CLASS_INPUT_SIZE, CLASS_INPUT_SIZE), config.INT8_CLASS_MODEL_PATH)
+    print(f"Wrote {config.INT8_SEG_MODEL_PATH} and {config.INT8_CLASS_MODEL_PATH}")
+
+
+def median_latency_ms(fn, batch, repeats):
+    fn(batch)
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(batch)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def measure(backend, images, repeats):
+    seg_batch = torch.stack([seg_transform(to_image_tensor(image)) for image in images])
+    class_batch = torch.stack([class_transform(to_image_tensor(image)) for image in images])
+    return {
+        "size_bytes": model_size_bytes(backend.seg_model) + model_size_bytes(backend.class_model),
+        "seg_latency_ms": median_latency_ms(backend.segment, seg_batch, repeats),
+        "class_latency_ms": median_latency_ms(backend.classify, class_batch, repeats),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", help="Directory of fixture images (default: seeded synthetic images)")
+    parser.add_argument("--mode", action="append", choices=PRECISIONS[1:], help="Modes to report (default: all)")
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--report", help="Write the report as JSON to this path")
+    args = parser.parse_args(argv)
+    modes = args.mode or list(PRECISIONS[1:])
+
+    images = load_fixtures(args.images)
+    if "int8-static" in modes:
+        calibrate_static(images)
+
+    device = torch.device("cpu")
+    fp32 = EagerBackend(*load_models(device), device)
+    baseline = measure(fp32, images, args.repeats)
+    report = {"fp32": baseline}
+    print(f"fp32: {baseline['size_bytes'] / 2**20:.1f} MiB, seg {baseline['seg_latency_ms']:.1f} ms, class {baseline['class_latency_ms']:.1f} ms")
+    for mode in modes:
+        models = (None, None) if mode == "int8-static" else load_models(device)
+        backend = EagerBackend(*apply_precision(*models, mode), device)
+        result = measure(backend, images, args.repeats)
+        result["mask_mismatch"], result["max_prob_diff"] = compare(fp32, backend, images)
+        result["size_delta"] = result["size_bytes"] / baseline["size_bytes"] - 1
+        result["seg_latency_delta"] = result["seg_latency_ms"] / baseline["seg_latency_ms"] - 1
+        result["class_latency_delta"] = result["class_latency_ms"] / baseline["class_latency_ms"] - 1
+        report[mode] = result
+        print(
+            f"{mode}: {result['size_bytes'] / 2**20:.1f} MiB ({result['size_delta']:+.0%}), "
+            f"seg {result['seg_latency_ms']:.1f} ms ({result['seg_latency_delta']:+.0%}), "
+            f"class {result['class_latency_ms']:.1f} ms ({result['class_latency_delta']:+.0%}), "
+            f"mask mismatch {result['mask_mismatch']:.2e}, max prob diff {result['max_prob_diff']:.2e}"
+        )
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
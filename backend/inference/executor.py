@@ -0,0 +1,39 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+
+_executor = None
+
+
+def get_executor():
+    """Return the shared CPU-bound executor, creating it on first use."""
+    global _executor
+    if _executor is None:
+        import torch
+        torch.set_num_threads(config.TORCH_NUM_THREADS)
+        _executor = ThreadPoolExecutor(
+            max_workers=config.INFERENCE_WORKERS,
+            thread_name_prefix="inference",
+        )
+    return _executor
+
+
+async def run_blocking(fn, *args, **kwargs):
+    """Run ``fn`` on the CPU-bound executor and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(fn, *args, **kwargs))
+
+
+def executor_backlog():
+    """Number of submitted calls still waiting for a free executor thread."""
+    # ThreadPoolExecutor keeps no public count of its pending work
+    return _executor._work_queue.qsize() if _executor is not None else 0
+
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
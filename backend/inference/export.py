@@ -0,0 +1,45 @@
+"""
+Export the UNet and VGG19Binary checkpoints to ONNX with a dynamic batch axis.
+
+    python -m inference.export [--seg-out PATH] [--class-out PATH] [--opset N]
+
+The outputs default to ONNX_SEG_MODEL_PATH and ONNX_CLASS_MODEL_PATH, which is
+where INFERENCE_BACKEND=onnx loads them from.
+"""
+import argparse
+
+import torch
+
+import config
+from .backends import CLASS_INPUT_SIZE, SEG_INPUT_SIZE, load_models
+
+
+def export_model(model, size, path, opset):
+    example = torch.zeros(1, 3, size, size)
+    torch.onnx.export(
+        model,
+        example,
+        path,
+        input_names=["input"],
+        output_names=["output"],
+        dynamic_axes={"input": {0: "batch"}, "output": {0: "batch"}},
+        opset_version=opset,
+    )
+    print(f"Exported {type(model).__name__} to {path}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seg-out", default=config.ONNX_SEG_MODEL_PATH)
+    parser.add_argument("--class-out", default=config.ONNX_CLASS_MODEL_PATH)
+    parser.add_argument("--opset", type=int, default=17)
+    args = parser.parse_args(argv)
+
+    seg_model, class_model = load_models(torch.device("cpu"))
+    with torch.no_grad():
+        export_model(seg_model, SEG_INPUT_SIZE, args.seg_out, args.opset)
+        export_model(class_model, CLASS_INPUT_SIZE, args.class_out, args.opset)
+
+
+if __name__ == "__main__":
+    main()
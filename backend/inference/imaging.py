@@ -0,0 +1,79 @@
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+import metrics
+from . import dicom
+
+# (offset, signature, format) checked against the first bytes of an upload
+MAGIC_BYTES = [
+    (dicom.PREAMBLE_LENGTH, dicom.DICM_PREFIX, "dicom"),
+    (0, b"\x89PNG\r\n\x1a\n", "png"),
+    (0, b"\xff\xd8\xff", "jpeg"),
+    (0, b"GIF87a", "gif"),
+    (0, b"GIF89a", "gif"),
+    (0, b"BM", "bmp"),
+    (0, b"II*\x00", "tiff"),
+    (0, b"MM\x00*", "tiff"),
+]
+
+
+def sniff_format(data):
+    """Identify an upload from its magic bytes without decoding it."""
+    for offset, signature, fmt in MAGIC_BYTES:
+        if data[offset:offset + len(signature)] == signature:
+            return fmt
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    return "unknown"
+
+
+def pil_to_array(data):
+    with Image.open(BytesIO(data)) as image:
+        with metrics.DECODE_SECONDS.labels(image.format.lower() if image.format else "unknown").time():
+            return np.array(image.convert("RGB"))
+
+
+def decode_frames(data):
+    """
+    Open upload bytes as a lazy sequence of (H, W, 3) uint8 RGB arrays.
+    The format is taken from the magic bytes; unrecognized uploads are tried
+    with PIL first and then as a DICOM dataset without a preamble. For DICOM
+    only the header is parsed up front and each frame is decoded as the
+    iterator advances; other formats hold a single image.
+    Returns the detected format, the number of frames and the iterator.
+    """
+    fmt, count, frames = _decode_frames(data)
+    metrics.INPUTS.labels(fmt).inc()
+    return fmt, count, frames
+
+
+def _decode_frames(data):
+    fmt = sniff_format(data)
+    if fmt == "unknown":
+        try:
+            return fmt, 1, iter([pil_to_array(data)])
+        except Exception:
+            pass
+        try:
+            ds = dicom.read_header(data)
+        except ValueError:
+            raise ValueError("Unsupported image format")
+        return "dicom", dicom.frame_count(ds), dicom.iter_frames(data, ds)
+    if fmt == "dicom":
+        ds = dicom.read_header(data)
+        return fmt, dicom.frame_count(ds), dicom.iter_frames(data, ds)
+    return fmt, 1, iter([pil_to_array(data)])
+
+
+def decode_image(data):
+    """
+    Decode upload bytes into a single (H, W, 3) uint8 RGB array, the first
+    frame of a multi-frame DICOM. Returns the array and the detected format.
+    """
+    fmt, _, frames = decode_frames(data)
+    image = next(frames, None)
+    if image is None:
+        raise ValueError("Image has no frames")
+    return image, fmt
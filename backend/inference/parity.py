@@ -0,0 +1,66 @@
+"""
+Check that an inference backend matches eager PyTorch within tolerance.
+
+    python -m inference.parity --backend onnx [--backend torchscript] [--images DIR]
+
+Runs the fixture images in DIR (or seeded synthetic images when omitted)
+through eager and each requested backend, and compares segmentation masks
+and classification probabilities. Exits with status 1 if any backend is out
+of tolerance.
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import torch
+
+from .backends import create_backend
+from .imaging import decode_image
+from .predict import class_transform, seg_transform, to_image_tensor
+
+
+def load_fixtures(images_dir, count=8, seed=0):
+    if images_dir:
+        images = []
+        for name in sorted(os.listdir(images_dir)):
+            with open(os.path.join(images_dir, name), "rb") as f:
+                images.append(decode_image(f.read())[0])
+        return images
+    rng = np.random.default_rng(seed)
+    sizes = [(128, 128), (256, 256), (512, 384), (1024, 1024)]
+    return [rng.integers(0, 256, size=(*sizes[i % len(sizes)], 3), dtype=np.uint8) for i in range(count)]
+
+
+def compare(reference, candidate, images):
+    """Return the worst-case mask disagreement and probability difference."""
+    seg_batch = torch.stack([seg_transform(to_image_tensor(image)) for image in images])
+    class_batch = torch.stack([class_transform(to_image_tensor(image)) for image in images])
+    ref_masks = torch.sigmoid(reference.segment(seg_batch)) > 0.5
+    masks = torch.sigmoid(candidate.segment(seg_batch)) > 0.5
+    mask_mismatch = (ref_masks != masks).float().mean(dim=(1, 2, 3)).max().item()
+    prob_diff = (reference.classify(class_batch) - candidate.classify(class_batch)).abs().max().item()
+    return mask_mismatch, prob_diff
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", action="append", required=True, help="Backend to compare against eager")
+    parser.add_argument("--images", help="Directory of fixture images (PNG/JPEG/DICOM)")
+    parser.add_argument("--max-mask-mismatch", type=float, default=1e-3, help="Max fraction of differing mask pixels")
+    parser.add_argument("--atol", type=float, default=1e-3, help="Max absolute probability difference")
+    args = parser.parse_args(argv)
+
+    images = load_fixtures(args.images)
+    reference = create_backend("eager", torch.device("cpu"))
+    failed = False
+    for name in args.backend:
+        mask_mismatch, prob_diff = compare(reference, create_backend(name, torch.device("cpu")), images)
+        ok = mask_mismatch <= args.max_mask_mismatch and prob_diff <= args.atol
+        failed |= not ok
+        print(f"{name}: mask mismatch {mask_mismatch:.2e}, max prob diff {prob_diff:.2e} -> {'OK' if ok else 'FAIL'}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
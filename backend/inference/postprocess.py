@@ -0,0 +1,94 @@
+import numpy as np
+
+# Neighbour offsets (dy, dx) for 8-connected components
+NEIGHBOURS = [(dy, dx) for dy in (-1, 0, 1) for dx in (-1, 0, 1) if (dy, dx) != (0, 0)]
+
+
+def label_components(mask):
+    """
+    Label the 8-connected components of a binary mask.
+
+    Every foreground pixel starts with its own label, then labels are
+    propagated as the minimum over the neighbourhood, with pointer jumping to
+    collapse long chains, until nothing changes. Each step is a handful of
+    whole-array operations, so no per-pixel Python loop runs. Returns an int
+    array with 0 for background and 1..n for the components, and n.
+    """
+    mask = np.asarray(mask) > 0.5
+    h, w = mask.shape
+    if not mask.any():
+        return np.zeros((h, w), dtype=np.int32), 0
+    background = h * w + 1
+    labels = np.where(mask, np.arange(1, h * w + 1).reshape(h, w), background)
+    padded = np.full((h + 2, w + 2), background)
+    while True:
+        padded[1:-1, 1:-1] = labels
+        neighbourhood = labels
+        for dy, dx in NEIGHBOURS:
+            neighbourhood = np.minimum(neighbourhood, padded[1 + dy:h + 1 + dy, 1 + dx:w + 1 + dx])
+        updated = np.where(mask, neighbourhood, background)
+        # Pointer jumping: a label is a pixel index, follow it to that pixel's label
+        updated[mask] = updated.reshape(-1)[updated[mask] - 1]
+        if np.array_equal(updated, labels):
+            break
+        labels = updated
+    # Renumber over the foreground only, so a mask without background still gets 1..n
+    _, inverse = np.unique(labels[mask], return_inverse=True)
+    consecutive = np.zeros((h, w), dtype=np.int32)
+    consecutive[mask] = inverse.reshape(-1) + 1
+    return consecutive, int(consecutive.max())
+
+
+def scale_box(box, mask_shape, size):
+    """
+    Map an inclusive (x_min, y_min, x_max, y_max) box on a low-resolution mask
+    to the original image of ``size`` (width, height), analytically and
+    without materializing an upscaled mask. Mask pixel x covers original
+    pixels [x * sx, (x + 1) * sx), so the box is the union of those spans.
+    """
+    mask_h, mask_w = mask_shape
+    width, height = size
+    sx, sy = width / mask_w, height / mask_h
+    x_min, y_min, x_max, y_max = box
+    return (
+        int(x_min * sx),
+        int(y_min * sy),
+        min(width - 1, max(int(x_min * sx), int(np.ceil((x_max + 1) * sx)) - 1)),
+        min(height - 1, max(int(y_min * sy), int(np.ceil((y_max + 1) * sy)) - 1)),
+    )
+
+
+def find_lesions(mask, size):
+    """
+    Locate every lesion of a low-resolution binary mask in the original image.
+
+    Returns the overall bounding box (or None for an empty mask) and a list
+    of ``{"bbox": [x_min, y_min, x_max, y_max], "area": pixels}`` per
+    connected component, largest first, all in original image coordinates.
+    """
+    labels, count = label_components(mask)
+    if count == 0:
+        return None, []
+    ys, xs = np.nonzero(labels)
+    ids = labels[ys, xs] - 1
+    x_min = np.full(count, labels.shape[1])
+    y_min = np.full(count, labels.shape[0])
+    x_max = np.zeros(count, dtype=np.int64)
+    y_max = np.zeros(count, dtype=np.int64)
+    np.minimum.at(x_min, ids, xs)
+    np.minimum.at(y_min, ids, ys)
+    np.maximum.at(x_max, ids, xs)
+    np.maximum.at(y_max, ids, ys)
+    areas = np.bincount(ids, minlength=count)
+    # Each mask pixel stands for this many original pixels
+    pixel_area = (size[0] * size[1]) / labels.size
+
+    lesions = [
+        {
+            "bbox": list(scale_box((x_min[i], y_min[i], x_max[i], y_max[i]), labels.shape, size)),
+            "area": int(round(areas[i] * pixel_area)),
+        }
+        for i in np.argsort(-areas, kind="stable")
+    ]
+    bbox = scale_box((xs.min(), ys.min(), xs.max(), ys.max()), labels.shape, size)
+    return bbox, lesions
@@ -0,0 +1,92 @@
+import io
+import os
+
+import torch
+import torch.nn as nn
+
+import config
+
+PRECISIONS = ("fp32", "int8-dynamic", "int8-static", "bf16")
+
+
+def bf16_supported():
+    try:
+        return torch.backends.mkldnn.is_available() and torch.ops.mkldnn._is_mkldnn_bf16_supported()
+    except (AttributeError, RuntimeError):
+        return False
+
+
+class BF16Autocast(nn.Module):
+    """Runs the wrapped model under CPU bfloat16 autocast and returns fp32 outputs."""
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, x):
+        with torch.autocast("cpu", dtype=torch.bfloat16):
+            return self.model(x).float()
+
+
+def quantize_dynamic(model):
+    """INT8 weights for every nn.Linear, activations quantized on the fly."""
+    return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+
+def quantize_static(model, calibration_batches, backend="x86"):
+    """
+    FX graph mode INT8 quantization of the whole network, conv stacks included.
+    Activation ranges are observed on ``calibration_batches`` (float tensors
+    already passed through the model's transform).
+    """
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+    torch.backends.quantized.engine = backend
+    prepared = prepare_fx(model.eval(), get_default_qconfig_mapping(backend), (calibration_batches[0],))
+    with torch.no_grad():
+        for batch in calibration_batches:
+            prepared(batch)
+    return convert_fx(prepared)
+
+
+def save_quantized(model, example, path):
+    """Persist a converted model as TorchScript so it loads without re-calibrating."""
+    with torch.no_grad():
+        torch.jit.save(torch.jit.freeze(torch.jit.trace(model, example)), path)
+
+
+def model_size_bytes(model):
+    """Serialized size of a model's weights, a proxy for its memory footprint."""
+    buffer = io.BytesIO()
+    if isinstance(model, torch.jit.ScriptModule):
+        torch.jit.save(model, buffer)
+    else:
+        torch.save(model.state_dict(), buffer)
+    return buffer.tell()
+
+
+def effective_precision(precision):
+    """The precision ``precision`` is actually served at on this machine."""
+    if precision == "bf16" and not bf16_supported():
+        print("Warning: this CPU has no bfloat16 support, serving fp32 instead")
+        return "fp32"
+    return precision
+
+
+def apply_precision(seg_model, class_model, precision):
+    """Return the (seg_model, class_model) pair to serve for ``precision``."""
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown inference precision '{precision}', expected one of {', '.join(PRECISIONS)}")
+    if precision == "int8-dynamic":
+        return quantize_dynamic(seg_model), quantize_dynamic(class_model)
+    if precision == "int8-static":
+        models = []
+        for path in (config.INT8_SEG_MODEL_PATH, config.INT8_CLASS_MODEL_PATH):
+            if not os.path.exists(path):
+                raise FileNotFoundError(2, "No such file, run `python -m inference.calibrate` first", path)
+            models.append(torch.jit.load(path, map_location="cpu").eval())
+        return tuple(models)
+    if precision == "bf16":
+        if effective_precision(precision) == "fp32":
+            return seg_model, class_model
+        return BF16Autocast(seg_model).eval(), BF16Autocast(class_model).eval()
+    return seg_model, class_model
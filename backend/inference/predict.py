@@ -0,0 +1,83 @@
+from functools import cache
+
+import torch
+
+import metrics
+
+from .tiling import seg_predict_tiled, use_tiling
+
+
+@cache
+def _transforms():
+    # torchvision is imported on first use to keep it off the startup path
+    from torchvision import transforms
+    seg = transforms.Compose([
+        transforms.Resize((128, 128), antialias=True),
+        transforms.ConvertImageDtype(torch.float),
+    ])
+    cls = transforms.Compose([
+        transforms.Resize((224, 224), antialias=True),
+        transforms.ConvertImageDtype(torch.float),
+        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
+    ])
+    return seg, cls
+
+
+# Transforms take a (3, H, W) uint8 tensor viewing the decoded upload array,
+# so segmentation and classification share one decode of the image.
+def seg_transform(image):
+    return _transforms()[0](image)
+
+
+def class_transform(image):
+    return _transforms()[1](image)
+
+
+def to_image_tensor(image):
+    """Wrap an (H, W, 3) uint8 array as a (3, H, W) tensor without copying."""
+    return torch.from_numpy(image).permute(2, 0, 1)
+
+
+def seg_predict_batch(backend, images):
+    """Segment a list of (H, W, 3) uint8 arrays with a single forward pass."""
+    with metrics.STAGE_SECONDS.labels("seg_preprocess").time():
+        image_tensor = torch.stack([seg_transform(to_image_tensor(image)) for image in images])
+    metrics.BATCH_SIZE.labels("segmentation").observe(len(images))
+    with metrics.STAGE_SECONDS.labels("seg_forward").time():
+        output = backend.segment(image_tensor)
+    output = torch.sigmoid(output)
+    output = (output > 0.5).float()
+    # One (H, W) mask per input image
+    return list(output[:, 0].numpy())
+
+
+def class_predict_batch(backend, images):
+    """Classify a list of (H, W, 3) uint8 arrays with a single forward pass.
+
+    Returns a list of ``(prob, pred_class)`` tuples, one per image.
+    """
+    with metrics.STAGE_SECONDS.labels("class_preprocess").time():
+        image_tensor = torch.stack([class_transform(to_image_tensor(image)) for image in images])
+    metrics.BATCH_SIZE.labels("classification").observe(len(images))
+    with metrics.STAGE_SECONDS.labels("class_forward").time():
+        probs = backend.classify(image_tensor)[:, 0].tolist()
+    return [(prob, 1 if prob > 0.5 else 0) for prob in probs]
+
+
+def segment_batch(backend, images):
+    """
+    Segment a batch of decoded (H, W, 3) uint8 images, one (H, W) mask each.
+    Large images are segmented tile by tile when tiling is enabled, the rest
+    in one batch at the model's native 128x128.
+    """
+    tiled = [use_tiling(image) for image in images]
+    masks = [None] * len(images)
+    small = [i for i, is_tiled in enumerate(tiled) if not is_tiled]
+    if small:
+        for i, mask in zip(small, seg_predict_batch(backend, [images[i] for i in small])):
+            masks[i] = mask
+    for i in (i for i, is_tiled in enumerate(tiled) if is_tiled):
+        with metrics.STAGE_SECONDS.labels("seg_tiled").time():
+            masks[i] = seg_predict_tiled(backend, images[i])
+    return masks
+
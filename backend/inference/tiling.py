@@ -0,0 +1,81 @@
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+import config
+
+
+def tile_starts(length, tile_size, stride):
+    """Start offsets of tiles covering ``length``, the last one flush with the end."""
+    starts = list(range(0, length - tile_size + 1, stride))
+    if starts[-1] != length - tile_size:
+        starts.append(length - tile_size)
+    return starts
+
+
+def blend_window(tile_size, overlap):
+    """
+    Weights that fade each tile's logits out towards its borders, so
+    overlapping tiles blend smoothly. Every weight is positive.
+    """
+    ramp = np.minimum(np.arange(1, tile_size + 1), np.arange(tile_size, 0, -1)) / max(overlap, 1)
+    ramp = np.clip(ramp, 0, 1).astype(np.float32)
+    return torch.from_numpy(np.outer(ramp, ramp))
+
+
+def working_size(image, max_side):
+    h, w = image.shape[:2]
+    scale = min(1.0, max_side / max(h, w))
+    return round(h * scale), round(w * scale)
+
+
+def use_tiling(image):
+    """Whether ``image`` should be segmented tile by tile under the current config."""
+    if not config.SEG_TILED or max(image.shape[:2]) < config.TILED_MIN_SIDE:
+        return False
+    return min(working_size(image, config.TILED_MAX_SIDE)) >= config.TILE_SIZE
+
+
+def seg_predict_tiled(backend, image, tile_size=None, overlap=None, max_side=None, batch_size=None):
+    """
+    Segment a large (H, W, 3) uint8 image as overlapping tiles.
+
+    The mask is produced at a working resolution of at most ``max_side``
+    pixels per side. Each tile is cropped from the original array (a view)
+    and resized on its own while still uint8, so the full image is never
+    resized or converted to float, and only ``batch_size`` tiles are in
+    flight at once. Float buffers are therefore bounded by the working
+    resolution, not the input size.
+    Returns an (h, w) float32 mask of 0s and 1s.
+    """
+    tile_size = tile_size or config.TILE_SIZE
+    overlap = config.TILE_OVERLAP if overlap is None else overlap
+    max_side = max_side or config.TILED_MAX_SIDE
+    batch_size = batch_size or config.TILE_BATCH_SIZE
+
+    height, width = image.shape[:2]
+    out_h, out_w = working_size(image, max_side)
+    sy, sx = height / out_h, width / out_w
+    source = torch.from_numpy(image).permute(2, 0, 1)
+
+    logits = torch.zeros(out_h, out_w)
+    weights = torch.zeros(out_h, out_w)
+    window = blend_window(tile_size, overlap)
+    stride = max(1, tile_size - overlap)
+    tiles = [(y, x) for y in tile_starts(out_h, tile_size, stride) for x in tile_starts(out_w, tile_size, stride)]
+
+    for i in range(0, len(tiles), batch_size):
+        chunk = tiles[i:i + batch_size]
+        crops = []
+        for y, x in chunk:
+            crop = source[:, round(y * sy):round((y + tile_size) * sy), round(x * sx):round((x + tile_size) * sx)]
+            # Resized while still uint8, so only tile-sized crops become float
+            crop = F.interpolate(crop.unsqueeze(0), size=(tile_size, tile_size), mode="bilinear", antialias=True, align_corners=False)
+            crops.append(crop[0].float().div_(255))
+        output = backend.segment(torch.stack(crops))[:, 0]
+        for (y, x), tile_logits in zip(chunk, output):
+            logits[y:y + tile_size, x:x + tile_size] += tile_logits * window
+            weights[y:y + tile_size, x:x + tile_size] += window
+
+    # sigmoid(logits) > 0.5 exactly when the blended logits are positive
+    return (logits / weights > 0).float().numpy()
@@ -0,0 +1,27 @@
+import time
+
+import numpy as np
+import torch
+
+from .backends import CLASS_INPUT_SIZE, SEG_INPUT_SIZE
+from .predict import class_transform, seg_transform, to_image_tensor
+
+
+def warmup(backend, batch_sizes, rounds=2):
+    """
+    Run synthetic batches of every size in ``batch_sizes`` through both
+    networks so lazy initialization happens before real traffic arrives.
+    Returns the time taken in milliseconds.
+    """
+    start = time.perf_counter()
+    # The transforms import torchvision on first use
+    image = to_image_tensor(np.zeros((SEG_INPUT_SIZE, SEG_INPUT_SIZE, 3), dtype=np.uint8))
+    seg_transform(image)
+    class_transform(image)
+    for batch_size in batch_sizes:
+        seg_batch = torch.rand(batch_size, 3, SEG_INPUT_SIZE, SEG_INPUT_SIZE)
+        class_batch = torch.rand(batch_size, 3, CLASS_INPUT_SIZE, CLASS_INPUT_SIZE)
+        for _ in range(rounds):
+            backend.segment(seg_batch)
+            backend.classify(class_batch)
+    return (time.perf_counter() - start) * 1000
@@ -0,0 +1,209 @@
+import asyncio
+import json
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, func, or_, update
+from sqlmodel import Session, select
+
+import config
+from db import engine
+from entities import InferenceJob
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+def read_file(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+class JobQueue:
+    """
+    Persistent queue of inference jobs backed by the ``InferenceJob`` table.
+
+    Uploads are written under ``JOB_DIR`` and a row is inserted per job;
+    ``JOB_WORKERS`` background tasks claim rows in priority order and hand
+    them to ``handler(data)``, whose JSON result is stored on the
+    row. Claims are atomic updates, so several processes can share the
+    table. The running worker renews its lease every third of
+    ``lease_seconds``; a job whose lease expired (its worker died) is claimed
+    again, and only the latest claim may finish it.
+    """
+    def __init__(self, workers=1, poll_interval=1.0, lease_seconds=600, max_attempts=3):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.handler = None
+        self._tasks = []
+        self._wakeup = None
+        # job id -> attempt number of our claim
+        self._running = {}
+
+    def start(self, handler):
+        self.handler = handler
+        self._wakeup = asyncio.Event()
+        os.makedirs(config.JOB_DIR, exist_ok=True)
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Hand interrupted jobs straight back instead of waiting out their lease
+        if self._running:
+            await asyncio.to_thread(self._requeue, list(self._running.items()))
+            self._running.clear()
+
+    async def submit(self, filename, data, priority=0):
+        """Persist an upload as a queued job and return the job row."""
+        job = InferenceJob(filename=filename, input_path="", priority=priority)
+        job.input_path = os.path.join(config.JOB_DIR, job.id)
+        await asyncio.to_thread(self._insert, job, data)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job
+
+    @staticmethod
+    def _insert(job, data):
+        with open(job.input_path, "wb") as f:
+            f.write(data)
+        with Session(engine, expire_on_commit=False) as session:
+            session.add(job)
+            session.commit()
+
+    def _claimable(self, now):
+        stale = now - timedelta(seconds=self.lease_seconds)
+        return or_(
+            InferenceJob.status == QUEUED,
+            and_(
+                InferenceJob.status == RUNNING,
+                func.coalesce(InferenceJob.heartbeat_at, InferenceJob.started_at) < stale,
+            ),
+        )
+
+    def _claim(self):
+        """Atomically move the next claimable job to running, or return None."""
+        with Session(engine, expire_on_commit=False) as session:
+            while True:
+                now = datetime.utcnow()
+                job_id = session.exec(
+                    select(InferenceJob.id)
+                    .where(self._claimable(now))
+                    .order_by(InferenceJob.priority.desc(), InferenceJob.created_at)
+                    .limit(1)
+                ).first()
+                if job_id is None:
+                    return None
+                claimed = session.execute(
+                    update(InferenceJob)
+                    .where(InferenceJob.id == job_id, self._claimable(now))
+                    .values(status=RUNNING, started_at=now, heartbeat_at=now, attempts=InferenceJob.attempts + 1)
+                )
+                session.commit()
+                # Another worker got there first; try the next one
+                if claimed.rowcount == 1:
+                    return session.get(InferenceJob, job_id)
+
+    @staticmethod
+    def _ours(job_id, attempts):
+        """Rows still held by our claim of ``job_id`` (attempt ``attempts``)."""
+        return and_(
+            InferenceJob.id == job_id,
+            InferenceJob.attempts == attempts,
+            InferenceJob.status == RUNNING,
+        )
+
+    def _requeue(self, claims):
+        with Session(engine) as session:
+            for job_id, attempts in claims:
+                session.execute(
+                    update(InferenceJob)
+                    .where(self._ours(job_id, attempts))
+                    .values(status=QUEUED, started_at=None, heartbeat_at=None)
+                )
+            session.commit()
+
+    def _renew(self, job_id, attempts):
+        """Extend our lease; False if the job was claimed again meanwhile."""
+        with Session(engine) as session:
+            renewed = session.execute(
+                update(InferenceJob)
+                .where(self._ours(job_id, attempts))
+                .values(heartbeat_at=datetime.utcnow())
+            )
+            session.commit()
+            return renewed.rowcount == 1
+
+    async def _heartbeat(self, job):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                if not await asyncio.to_thread(self._renew, job.id, job.attempts):
+                    print(f"Job {job.id} was claimed by another worker, its result will be discarded")
+                    return
+            except Exception as e:
+                print(f"Error: could not renew the lease of job {job.id}: {e}")
+
+    def _finish(self, job, status, result=None, error=None):
+        with Session(engine) as session:
+            finished = session.execute(
+                update(InferenceJob)
+                .where(self._ours(job.id, job.attempts))
+                .values(status=status, result=result, error=error, finished_at=datetime.utcnow())
+            )
+            session.commit()
+        # A newer claim owns the job (and its input) now
+        if finished.rowcount == 1 and os.path.exists(job.input_path):
+            os.remove(job.input_path)
+
+    async def _work(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                job = await asyncio.to_thread(self._claim)
+            except Exception as e:
+                print(f"Error: could not claim an inference job: {e}")
+                job = None
+            if job is None:
+                # Also poll, for jobs submitted through other processes
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _run(self, job):
+        if job.attempts > self.max_attempts:
+            await asyncio.to_thread(self._finish, job, FAILED, error=f"Gave up after {self.max_attempts} attempts")
+            return
+        self._running[job.id] = job.attempts
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            data = await asyncio.to_thread(read_file, job.input_path)
+            result = await self.handler(data)
+        except asyncio.CancelledError:
+            # Shutting down: stop() puts the job back in the queue
+            raise
+        except Exception as e:
+            self._running.pop(job.id, None)
+            await asyncio.to_thread(self._finish, job, FAILED, error=str(e))
+        else:
+            self._running.pop(job.id, None)
+            await asyncio.to_thread(self._finish, job, SUCCEEDED, result=json.dumps(result))
+        finally:
+            heartbeat.cancel()
+
+
+job_queue = JobQueue(
+    workers=config.JOB_WORKERS,
+    poll_interval=config.JOB_POLL_INTERVAL,
+    lease_seconds=config.JOB_LEASE_SECONDS,
+    max_attempts=config.JOB_MAX_ATTEMPTS,
+)
@@ -0,0 +1,231 @@
+"""
+In-process metrics rendered in the Prometheus text exposition format.
+
+Recording a sample is a lock-protected increment, and nothing is formatted
+until ``/metrics`` is scraped, so instrumentation is cheap when nobody is
+looking. Values that already live elsewhere (queue depths, cache counters)
+are read by callbacks at scrape time instead of being tracked twice.
+Metrics are per process: with several workers, each one reports its own.
+"""
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds, from sub-millisecond transforms to multi-second cold batches
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REGISTRY = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value))
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        self._callback = None
+        REGISTRY.append(self)
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._child())
+        return child
+
+    def set_function(self, callback):
+        """
+        Read the value at scrape time: ``callback()`` returns a number, or a
+        dict mapping label value tuples to numbers.
+        """
+        self._callback = callback
+
+    def _samples(self):
+        if self._callback is not None:
+            value = self._callback()
+            items = value.items() if isinstance(value, dict) else [((), value)]
+            return [(self.name, _labels(self.labelnames, key), value) for key, value in items]
+        return [
+            sample
+            for values, child in list(self._children.items())
+            for sample in child.samples(self.name, self.labelnames, values)
+        ]
+
+    def collect(self):
+        """
+        Current values by label value tuple: a number for counters and
+        gauges, ``(sum, count)`` for histograms. Callback metrics are read.
+        """
+        if self._callback is not None:
+            value = self._callback()
+            return dict(value) if isinstance(value, dict) else {(): value}
+        return {values: child.snapshot() for values, child in list(self._children.items())}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines += [f"{name}{labels} {_number(value)}" for name, labels, value in self._samples()]
+        return "\n".join(lines)
+
+
+class _Value:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set(self, value):
+        self.value = value
+
+    def snapshot(self):
+        return self.value
+
+    def samples(self, name, labelnames, values):
+        return [(name, _labels(labelnames, values), self.value)]
+
+
+class Counter(Metric):
+    type = "counter"
+    _child = _Value
+
+
+class Gauge(Metric):
+    type = "gauge"
+    _child = _Value
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def snapshot(self):
+        with self._lock:
+            return self.sum, sum(self.counts)
+
+    def samples(self, name, labelnames, values):
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        samples = []
+        cumulative = 0
+        for bound, count in zip((*self.buckets, math.inf), counts):
+            cumulative += count
+            samples.append((f"{name}_bucket", _labels(labelnames, values, [("le", _number(bound))]), cumulative))
+        samples.append((f"{name}_sum", _labels(labelnames, values), total))
+        samples.append((f"{name}_count", _labels(labelnames, values), cumulative))
+        return samples
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _child(self):
+        return _Histogram(self.buckets)
+
+
+def render():
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+@contextmanager
+def track_request(endpoint):
+    """Count a request as in flight, time it and count it as an error if it raises."""
+    IN_FLIGHT.labels(endpoint).inc()
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        ERRORS.labels(endpoint).inc()
+        raise
+    finally:
+        IN_FLIGHT.labels(endpoint).dec()
+        REQUEST_SECONDS.labels(endpoint).observe(time.perf_counter() - start)
+
+
+REQUEST_SECONDS = Histogram("request_seconds", "End-to-end latency of inference requests.", ["endpoint"])
+IN_FLIGHT = Gauge("requests_in_flight", "Inference requests currently being handled.", ["endpoint"])
+ERRORS = Counter("errors_total", "Inference requests that failed.", ["endpoint"])
+STAGE_SECONDS = Histogram(
+    "pipeline_stage_seconds",
+    "Time spent in each pipeline stage; model stages are timed per batch.",
+    ["stage"],
+)
+DECODE_SECONDS = Histogram("decode_seconds", "Time to decode one image or DICOM frame.", ["format"])
+INPUTS = Counter("inputs_total", "Uploads decoded, by detected format.", ["format"])
+CASES = Counter("cases_total", "Analyzed images and frames, by segmentation outcome.", ["result"])
+BATCH_SIZE = Histogram(
+    "batch_size", "Images per model forward pass.", ["model"], buckets=(1, 2, 4, 8, 16, 32, 64)
+)
+QUEUE_DEPTH = Gauge("queue_depth", "Work waiting to be picked up.", ["queue"])
+CACHE_EVENTS = Counter("inference_cache_events_total", "Inference cache lookups by outcome, and evictions.", ["event"])
+ARTIFACT_BYTES = Gauge("artifact_store_bytes", "Size of the result artifact store at its last collection.")
+ARTIFACT_EVICTIONS = Counter("artifact_evictions_total", "Result artifacts removed by garbage collection.")
+ADMISSION_REJECTED = Counter(
+    "admission_rejected_total", "Inference requests turned away by admission control.", ["reason"]
+)
+PRINCIPAL_CACHE_EVENTS = Counter(
+    "principal_cache_events_total",
+    "Authenticated principal lookups by outcome (hits, misses, claims), and invalidations and evictions.",
+    ["event"],
+)
+AUTH_DB_SECONDS = Histogram("auth_db_seconds", "Database time of the auth routes.", ["route"])
+AUTH_BCRYPT_SECONDS = Histogram(
+    "auth_bcrypt_seconds", "Time spent hashing or verifying passwords.", ["operation"]
+)
+AUTH_BCRYPT_QUEUE_SECONDS = Histogram(
+    "auth_bcrypt_queue_seconds", "Time password operations waited for a bcrypt thread.", ["operation"]
+)
+AUTH_BCRYPT_TIMEOUTS = Counter(
+    "auth_bcrypt_timeouts_total",
+    "Password operations rejected after waiting too long for a bcrypt thread.",
+    ["operation"],
+)
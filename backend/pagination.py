@@ -0,0 +1,144 @@
+"""
+Keyset pagination over the entity tables.
+
+A page is fetched with ``WHERE (keys) > (last keys) ORDER BY keys LIMIT n``
+on an index that starts with the sort keys, so its cost depends on the page
+size and not on how deep into the table the page is, unlike OFFSET. The
+cursor handed to clients is the sort keys of the last row returned.
+"""
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import tuple_
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from db import async_engine
+from entities import Doctor, Patient, Report
+
+
+class Listing:
+    """
+    The columns of ``model`` a listing may return, and its orderings: each
+    maps a name to the sort key columns, ending with a unique column.
+    """
+    def __init__(self, model, fields, orderings):
+        self.model = model
+        self.fields = fields
+        self.orderings = orderings
+
+    def column(self, name):
+        return getattr(self.model, name)
+
+    def parse_fields(self, fields):
+        """Requested comma separated field names, all listable ones if empty."""
+        if not fields:
+            return list(self.fields)
+        names = [name.strip() for name in fields.split(",") if name.strip()]
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise ValueError(f"Unknown fields {unknown}, expected some of {list(self.fields)}")
+        return list(dict.fromkeys(names))
+
+    def keys(self, order):
+        try:
+            return self.orderings[order]
+        except KeyError:
+            raise ValueError(f"Unknown order {order!r}, expected one of {list(self.orderings)}") from None
+
+
+# Password hashes are never listed
+DOCTORS = Listing(Doctor, ("id", "name", "email", "specialization"), {"id": ("id",)})
+PATIENTS = Listing(Patient, ("id", "name", "age", "gender", "contact", "email"), {"id": ("id",)})
+REPORTS = Listing(
+    Report,
+    (
+        "id", "patient_id", "diagnosis", "treatment", "date_created", "frame", "has_segment",
+        "prediction", "probability", "lesion_count", "annotated_image_url",
+    ),
+    {"id": ("id",), "date_created": ("date_created", "id")},
+)
+LISTINGS = {"doctors": DOCTORS, "patients": PATIENTS, "reports": REPORTS}
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def dumps(value):
+    return json.dumps(value, default=_json_default, separators=(",", ":"))
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(dumps(values).encode()).decode().rstrip("=")
+
+
+def decode_cursor(listing, order, cursor):
+    """The sort key values encoded in ``cursor``; ValueError if it is not one of ours."""
+    keys = listing.keys(order)
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        raise ValueError("Invalid cursor") from None
+    if not isinstance(values, list) or len(values) != len(keys):
+        raise ValueError("Invalid cursor")
+    decoded = []
+    for key, value in zip(keys, values):
+        python_type = listing.column(key).type.python_type
+        if python_type is datetime:
+            try:
+                value = datetime.fromisoformat(value)
+            except (TypeError, ValueError):
+                raise ValueError("Invalid cursor") from None
+        # Forged values of another type would reach the database as is
+        elif type(value) is not python_type:
+            raise ValueError("Invalid cursor")
+        decoded.append(value)
+    return decoded
+
+
+async def fetch_page(session, listing, names, order="id", descending=False, after=None, limit=50):
+    """
+    Return up to ``limit`` rows (dicts of ``names``) following the sort key
+    values ``after``, and the sort keys of the last row if more follow.
+    """
+    keys = listing.keys(order)
+    # The sort keys are always selected since the next cursor needs them
+    selected = list(dict.fromkeys([*names, *keys]))
+    key_columns = [listing.column(key) for key in keys]
+    statement = select(*[listing.column(name) for name in selected])
+    if after is not None:
+        position = tuple_(*key_columns)
+        bound = tuple_(*after)
+        statement = statement.where(position < bound if descending else position > bound)
+    statement = statement.order_by(*[column.desc() if descending else column for column in key_columns])
+    # One extra row tells whether there is a next page
+    result = await session.exec(statement.limit(limit + 1))
+    rows = [dict(zip(selected, row)) for row in result.all()]
+    more = len(rows) > limit
+    rows = rows[:limit]
+    next_keys = [rows[-1][key] for key in keys] if more else None
+    return [{name: row[name] for name in names} for row in rows], next_keys
+
+
+async def stream_json(listing, names, order="id", descending=False, batch_size=1000, prefix="[", suffix="]"):
+    """
+    Yield the whole listing as one JSON array, between ``prefix`` and
+    ``suffix``, fetching ``batch_size`` rows at a time. Each batch uses its
+    own short-lived session, so a slow client never holds a connection.
+    """
+    yield prefix
+    after = None
+    first = True
+    while True:
+        async with AsyncSession(async_engine) as session:
+            rows, after = await fetch_page(session, listing, names, order, descending, after, batch_size)
+        if rows:
+            yield ("" if first else ",") + ",".join(dumps(row) for row in rows)
+            first = False
+        if after is None:
+            break
+    yield suffix
@@ -0,0 +1,106 @@
+import asyncio
+import functools
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from passlib.context import CryptContext
+
+import config
+import metrics
+
+
+class PasswordQueueTimeout(Exception):
+    def __init__(self, retry_after):
+        super().__init__("password hashing queue is full")
+        self.retry_after = retry_after
+
+
+class PasswordHasher:
+    """
+    Hashes and verifies bcrypt passwords on a dedicated pool of ``workers``
+    threads (bcrypt releases the GIL), so a burst of logins neither blocks
+    the event loop nor competes with inference for its executor.
+
+    At most ``workers`` operations are submitted at a time; the rest wait up
+    to ``queue_timeout`` seconds for a turn and then raise
+    ``PasswordQueueTimeout``. New hashes use ``rounds``, and any stored hash
+    with a different cost is reported for rehashing by ``verify_and_update``.
+    """
+    def __init__(self, rounds, workers, queue_timeout):
+        self.rounds = rounds
+        self.workers = workers
+        self.queue_timeout = queue_timeout
+        # Pinning min and max to the cost marks every other cost as outdated
+        self.context = CryptContext(
+            schemes=["bcrypt"],
+            deprecated="auto",
+            bcrypt__rounds=rounds,
+            bcrypt__min_rounds=rounds,
+            bcrypt__max_rounds=rounds,
+        )
+        self.waiting = 0
+        self._executor = None
+        self._slots = None
+        self._loop = None
+
+    def _get_slots(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._slots = asyncio.Semaphore(self.workers)
+            self._loop = loop
+        return self._slots
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    def _timed(self, operation, fn, *args):
+        with metrics.AUTH_BCRYPT_SECONDS.labels(operation).time():
+            return fn(*args)
+
+    async def _run(self, operation, fn, *args):
+        slots = self._get_slots()
+        start = time.perf_counter()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            metrics.AUTH_BCRYPT_TIMEOUTS.labels(operation).inc()
+            raise PasswordQueueTimeout(max(1, math.ceil(self.queue_timeout)))
+        finally:
+            self.waiting -= 1
+            metrics.AUTH_BCRYPT_QUEUE_SECONDS.labels(operation).observe(time.perf_counter() - start)
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._get_executor(), functools.partial(self._timed, operation, fn, *args)
+            )
+        finally:
+            slots.release()
+
+    async def hash(self, password):
+        return await self._run("hash", self.context.hash, password)
+
+    async def verify(self, password, password_hash):
+        return await self._run("verify", self.context.verify, password, password_hash)
+
+    async def verify_and_update(self, password, password_hash):
+        """
+        Return ``(valid, new_hash)``; ``new_hash`` is set when the password
+        is valid but ``password_hash`` was made with another cost.
+        """
+        return await self._run("verify", self.context.verify_and_update, password, password_hash)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(
+    rounds=config.BCRYPT_ROUNDS,
+    workers=config.BCRYPT_WORKERS,
+    queue_timeout=config.BCRYPT_QUEUE_TIMEOUT,
+)
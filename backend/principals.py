@@ -0,0 +1,121 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from pydantic import BaseModel
+from sqlalchemy import event
+
+import config
+from entities import Doctor
+
+# Token claims that together describe a principal without a lookup
+PROFILE_CLAIMS = ("name", "specialization")
+
+
+class Principal(BaseModel):
+    """The authenticated doctor, as handed to routes: everything but the password."""
+    id: int
+    name: str
+    email: str
+    specialization: str
+
+    @classmethod
+    def from_doctor(cls, doctor):
+        return cls(id=doctor.id, name=doctor.name, email=doctor.email, specialization=doctor.specialization)
+
+    @classmethod
+    def from_claims(cls, payload):
+        """The principal described by a token's claims, or None if they are incomplete."""
+        if any(payload.get(claim) is None for claim in ("id", "email", *PROFILE_CLAIMS)):
+            return None
+        return cls(**{field: payload[field] for field in cls.model_fields})
+
+
+def profile_claims(doctor):
+    return {claim: getattr(doctor, claim) for claim in PROFILE_CLAIMS}
+
+
+class PrincipalCache:
+    """
+    LRU of resolved principals keyed by doctor id. Each entry expires with
+    the token that resolved it, or after ``max_ttl`` seconds if sooner.
+    Lookups take a lock since sync dependencies run on a thread pool.
+    """
+    def __init__(self, max_entries, max_ttl=None):
+        self.max_entries = max_entries
+        self.max_ttl = max_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.claims = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def lookup(self, payload, trust_claims=False):
+        """
+        The principal of a decoded token without touching the database:
+        from its claims when trusted and complete, else from the cache.
+        Returns None when the caller has to load the doctor.
+        """
+        if trust_claims:
+            principal = Principal.from_claims(payload)
+            if principal is not None:
+                with self._lock:
+                    self.claims += 1
+                return principal
+        return self.get(payload.get("id"), payload.get("email"))
+
+    def get(self, doctor_id, email):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(doctor_id)
+            if entry is not None:
+                principal, expires_at = entry
+                if expires_at > now and principal.email == email:
+                    self._entries.move_to_end(doctor_id)
+                    self.hits += 1
+                    return principal
+                del self._entries[doctor_id]
+            self.misses += 1
+        return None
+
+    def put(self, principal, token_expires_at):
+        if self.max_entries <= 0:
+            return
+        expires_at = math.inf if token_expires_at is None else token_expires_at
+        if self.max_ttl:
+            expires_at = min(expires_at, time.time() + self.max_ttl)
+        with self._lock:
+            self._entries[principal.id] = (principal, expires_at)
+            self._entries.move_to_end(principal.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, doctor_id):
+        with self._lock:
+            if self._entries.pop(doctor_id, None) is not None:
+                self.invalidations += 1
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "claims": self.claims,
+            "invalidations": self.invalidations,
+            "evictions": self.evictions,
+        }
+
+
+principal_cache = PrincipalCache(config.PRINCIPAL_CACHE_SIZE, config.PRINCIPAL_CACHE_TTL or None)
+
+
+# Changes flushed through any session of this process drop the cached copy;
+# bulk UPDATE/DELETE statements bypass these events
+@event.listens_for(Doctor, "after_update")
+@event.listens_for(Doctor, "after_delete")
+def _invalidate_doctor(_mapper, _connection, target):
+    principal_cache.invalidate(target.id)
@@ -0,0 +1,31 @@
+import os
+
+
+def memory_usage(pid="self"):
+    """
+    Memory of a process from /proc/<pid>/smaps_rollup, in bytes (Linux only).
+
+    ``rss`` counts every resident page, ``shared`` the pages also mapped by
+    other processes (e.g. model weights inherited from a preloading master),
+    ``private`` the pages only this process maps, and ``pss`` splits shared
+    pages evenly between the processes that map them.
+    """
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) * 1024
+    return {
+        "pid": os.getpid() if pid == "self" else pid,
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "shared": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+        "private": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+def format_memory(usage):
+    def mib(n):
+        return f"{n / 2**20:.0f} MiB"
+    return f"pid {usage['pid']}: rss {mib(usage['rss'])}, pss {mib(usage['pss'])}, shared {mib(usage['shared'])}, private {mib(usage['private'])}"
@@ -0,0 +1,113 @@
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from db import async_engine, engine
+from entities import ArtifactPin, Patient, Report
+from inference.artifacts import mask_to_rle, pack_mask, unpack_mask
+from storage import artifact_digest
+
+ARTIFACT_URL_KEYS = ("segmentation_mask_url", "annotated_image_url")
+
+
+def report_from_result(patient_id, frame, result, response):
+    """
+    Build the report of one analyzed frame from its inference ``result``
+    (as cached by the pipeline) and its response body.
+    """
+    mask = result["mask"]
+    classification = response.get("classification")
+    prediction = classification["prediction"] if classification else None
+    bbox = [int(value) for value in result["bbox"]] if result["bbox"] is not None else [None] * 4
+    return Report(
+        patient_id=patient_id,
+        diagnosis=prediction or "No lesion detected",
+        treatment="",
+        frame=frame,
+        has_segment=response["has_segment"],
+        prediction=prediction,
+        # P(malignant) from the classifier, from 0 to 1, whatever the prediction
+        probability=float(result["classification"][0]) if result["classification"] else None,
+        lesion_count=len(result["lesions"]),
+        bbox_x_min=bbox[0],
+        bbox_y_min=bbox[1],
+        bbox_x_max=bbox[2],
+        bbox_y_max=bbox[3],
+        lesions=result["lesions"],
+        mask=pack_mask(mask),
+        mask_height=mask.shape[0],
+        mask_width=mask.shape[1],
+        annotated_image_url=response.get("annotated_image_url"),
+    )
+
+
+async def patient_exists(patient_id):
+    async with AsyncSession(async_engine) as session:
+        return await session.get(Patient, patient_id) is not None
+
+
+def response_artifacts(response):
+    """Digests of the stored artifacts a pipeline response links to."""
+    digests = set()
+    for frame_response in [response, *response.get("frames", [])]:
+        for key in ARTIFACT_URL_KEYS:
+            digest = artifact_digest(frame_response.get(key))
+            if digest is not None:
+                digests.add(digest)
+    return digests
+
+
+async def add_pins(session, digests):
+    if not digests:
+        return
+    dialect = postgresql if session.bind.dialect.name == "postgresql" else sqlite
+    # Identical results share artifacts, so the pin may exist already
+    await session.exec(
+        dialect.insert(ArtifactPin).values([{"digest": digest} for digest in sorted(digests)]).on_conflict_do_nothing()
+    )
+
+
+def pinned_digests():
+    with Session(engine) as session:
+        return set(session.exec(select(ArtifactPin.digest)).all())
+
+
+async def save_reports(patient_id, results, response):
+    """
+    Store one report per analyzed frame of an upload; ``results`` are the
+    frames' inference results in order and ``response`` the pipeline's
+    response body. Returns the new report ids.
+    """
+    responses = response["frames"] if "frames" in response else [response]
+    reports = [
+        report_from_result(patient_id, frame, result, frame_response)
+        for frame, (result, frame_response) in enumerate(zip(results, responses))
+    ]
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        session.add_all(reports)
+        await add_pins(session, response_artifacts(response))
+        await session.commit()
+    return [report.id for report in reports]
+
+
+def report_summary(report, include_mask=False):
+    summary = {
+        "id": report.id,
+        "date_created": report.date_created,
+        "frame": report.frame,
+        "diagnosis": report.diagnosis,
+        "treatment": report.treatment,
+        "has_segment": report.has_segment,
+        "prediction": report.prediction,
+        "probability": report.probability,
+        "lesion_count": report.lesion_count,
+        "bbox": None,
+        "lesions": report.lesions,
+        "annotated_image_url": report.annotated_image_url,
+    }
+    if report.bbox_x_min is not None:
+        summary["bbox"] = [report.bbox_x_min, report.bbox_y_min, report.bbox_x_max, report.bbox_y_max]
+    if include_mask and report.mask is not None:
+        mask = unpack_mask(report.mask, (report.mask_height, report.mask_width))
+        summary["segmentation_mask_rle"] = mask_to_rle(mask)
+    return summary
@@ -1,6 +1,9 @@
 from fastapi import APIRouter
 from routes.auth import doctorRoute, patientRoute
 from routes.images import router as imageRoute
+from routes.jobs import router as jobRoute
+from routes.listing import router as listingRoute
+from routes.patient import router as patientHistoryRoute
 
 router = APIRouter(
   prefix="/v1"
@@ -8,4 +11,7 @@ router = APIRouter(
 
 router.include_router(doctorRoute)
 router.include_router(patientRoute)
-router.include_router(imageRoute)
\ No newline at end of file
+router.include_router(imageRoute)
+router.include_router(jobRoute)
+router.include_router(listingRoute)
+router.include_router(patientHistoryRoute)
\ No newline at end of file
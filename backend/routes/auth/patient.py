@@ -1,15 +1,19 @@
 from fastapi import APIRouter, HTTPException, status, Depends, Body, Response, Cookie
 from entities import Doctor
-from db import SessionType
+from db import AsyncSessionType, SessionType
 from sqlmodel import select, delete
 from typing import List, Annotated, Dict
-from fastapi.responses import JSONResponse
-from passlib.context import CryptContext
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
 from pydantic import BaseModel, Field
 from datetime import datetime, timedelta, timezone
 import jwt
 from jwt.exceptions import PyJWTError, InvalidTokenError
+from metrics import AUTH_DB_SECONDS
+from passwords import password_hasher
+from principals import Principal, principal_cache, profile_claims
+import config
+import pagination
 
 
 router = APIRouter(
@@ -20,7 +24,6 @@ router = APIRouter(
 SECRET_KEY="secret"
 ALGORITHM="HS256"
 
-bcrypt_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
 oauth2_bearer = OAuth2PasswordBearer(tokenUrl='auth/token')
 
 class SignupPatientRequest(BaseModel):
@@ -34,10 +37,11 @@ class Token(BaseModel):
   access_token: str
   token_type: str
 
-def create_access_token(email: str, doctor_id: int, expires_delta: timedelta):
+def create_access_token(email: str, doctor_id: int, expires_delta: timedelta, claims: Dict | None = None):
   payload = {
     "id": doctor_id,
-    "email": email
+    "email": email,
+    **(claims or {})
   }
   expires = datetime.now(timezone.utc) + expires_delta
   payload.update({'exp': expires})
@@ -54,13 +58,22 @@ def process_signin(doctor: Dict = Body(...)):
 
 
 @router.post('/signin')
-async def signin(doctor: Annotated[Dict, Depends(process_signin)], session: SessionType, response: Response):
-  user: Doctor = session.exec(select(Doctor).where(Doctor.email == doctor["email"])).first()
+async def signin(doctor: Annotated[Dict, Depends(process_signin)], session: AsyncSessionType, response: Response):
+  with AUTH_DB_SECONDS.labels("patient_signin").time():
+    user: Doctor = (await session.exec(select(Doctor).where(Doctor.email == doctor["email"]))).first()
   if not user:
     raise HTTPException(status.HTTP_404_NOT_FOUND, { "message": "User not found" })
-  if not bcrypt_context.verify(doctor["password"], user.password):
+  valid, new_hash = await password_hasher.verify_and_update(doctor["password"], user.password)
+  if not valid:
     raise HTTPException(status.HTTP_401_UNAUTHORIZED, { "message": "Invalid password" })
-  token = create_access_token(user.email, user.id, timedelta(minutes=30))
+  if new_hash is not None:
+    # Stored with an outdated bcrypt cost, upgrade it while we know the password
+    user.password = new_hash
+    with AUTH_DB_SECONDS.labels("patient_signin").time():
+      session.add(user)
+      await session.commit()
+  claims = profile_claims(user) if config.TOKEN_CLAIMS else None
+  token = create_access_token(user.email, user.id, timedelta(minutes=30), claims)
   
   # TODO: need to fix set cookie
   response.set_cookie(
@@ -83,10 +96,11 @@ async def signin(doctor: Annotated[Dict, Depends(process_signin)], session: Sess
 @router.post('/signup', status_code=status.HTTP_201_CREATED)
 async def signup(
   doctor: SignupPatientRequest,
-  session: SessionType,
+  session: AsyncSessionType,
 
 ):
-  doctorFromDB = session.exec(select(Doctor).where(Doctor.email == doctor.email)).first()
+  with AUTH_DB_SECONDS.labels("patient_signup").time():
+    doctorFromDB = (await session.exec(select(Doctor).where(Doctor.email == doctor.email))).first()
 
   if doctorFromDB is not None:
     raise HTTPException(
@@ -96,14 +110,16 @@ async def signup(
       }
     )
 
+  password_hash = await password_hasher.hash(doctor.password)
   newDoctor = Doctor(
     name=doctor.name,
     email=doctor.email,
-    password=bcrypt_context.hash(doctor.password),
+    password=password_hash,
     specialization=doctor.specialization
   )
-  session.add(newDoctor)
-  session.commit()
+  with AUTH_DB_SECONDS.labels("patient_signup").time():
+    session.add(newDoctor)
+    await session.commit()
   # session.refresh(newDoctor)  
   return newDoctor
 
@@ -112,7 +128,7 @@ async def signup(
 def signout(session: SessionType):
   pass
 
-def get_current_doctor(token: Annotated[str, Depends(oauth2_bearer)], session: SessionType):
+async def get_current_doctor(token: Annotated[str, Depends(oauth2_bearer)], session: AsyncSessionType):
   credentials_exception = HTTPException(
     status_code=status.HTTP_401_UNAUTHORIZED,
     detail="Could not validate credentials",
@@ -125,13 +141,19 @@ def get_current_doctor(token: Annotated[str, Depends(oauth2_bearer)], session: S
           raise credentials_exception
   except InvalidTokenError:
       raise credentials_exception
-  doctor = session.exec(select(Doctor).where(Doctor.email == email)).first()
+  principal = principal_cache.lookup(payload, config.TOKEN_CLAIMS)
+  if principal is not None:
+    return principal
+  with AUTH_DB_SECONDS.labels("patient_current_user").time():
+    doctor = (await session.exec(select(Doctor).where(Doctor.email == email))).first()
   if doctor is None:
       raise credentials_exception
-  return doctor
+  principal = Principal.from_doctor(doctor)
+  principal_cache.put(principal, payload.get("exp"))
+  return principal
 
 @router.get('/me')
-def get_me(doctor: Annotated[Doctor, Depends(get_current_doctor)], access_token: Annotated[str | None, Cookie()] = None):
+def get_me(doctor: Annotated[Principal, Depends(get_current_doctor)], access_token: Annotated[str | None, Cookie()] = None):
   print(access_token)
   return JSONResponse(
      {
@@ -143,12 +165,16 @@ def get_me(doctor: Annotated[Doctor, Depends(get_current_doctor)], access_token:
   )
 
 @router.get('/all', status_code=status.HTTP_200_OK)
-def get_me(session: SessionType):
-  doctors = session.exec(select(Doctor)).all()
-  return JSONResponse(
-      content={
-          "message": "fetch success",
-          "data": [doc.model_dump() for doc in doctors]
-      },
+def get_all():
+  # Streamed in keyset batches, so memory stays flat however many doctors there are
+  return StreamingResponse(
+      pagination.stream_json(
+        pagination.DOCTORS,
+        list(pagination.DOCTORS.fields),
+        batch_size=config.LIST_EXPORT_BATCH_SIZE,
+        prefix='{"message":"fetch success","data":[',
+        suffix=']}',
+      ),
+      media_type="application/json",
       status_code=202
-  )
\ No newline at end of file
+  )
@@ -0,0 +1,63 @@
+from fastapi import APIRouter, HTTPException, status, File, UploadFile, Form
+from fastapi.responses import JSONResponse
+from entities import InferenceJob
+from db import SessionType
+import json
+
+from jobs import job_queue, SUCCEEDED, FAILED
+
+
+router = APIRouter(
+  prefix='/jobs',
+  tags=['jobs']
+)
+
+
+def job_summary(job: InferenceJob):
+  return {
+    "job_id": job.id,
+    "filename": job.filename,
+    "status": job.status,
+    "priority": job.priority,
+    "attempts": job.attempts,
+    "created_at": job.created_at.isoformat(),
+    "started_at": job.started_at.isoformat() if job.started_at else None,
+    "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    "error": job.error,
+  }
+
+
+@router.post('', status_code=status.HTTP_202_ACCEPTED)
+async def submit_job(file: UploadFile = File(...), priority: int = Form(0)):
+  job = await job_queue.submit(file.filename, await file.read(), priority)
+  return JSONResponse(
+    {
+      "job_id": job.id,
+      "status": job.status,
+      "message": "job queued"
+    },
+    status.HTTP_202_ACCEPTED,
+  )
+
+
+def get_job_or_404(job_id: str, session: SessionType):
+  job = session.get(InferenceJob, job_id)
+  if job is None:
+    raise HTTPException(status.HTTP_404_NOT_FOUND, { "message": "Job not found" })
+  return job
+
+
+@router.get('/{job_id}')
+def get_job(job_id: str, session: SessionType):
+  return job_summary(get_job_or_404(job_id, session))
+
+
+@router.get('/{job_id}/result')
+def get_job_result(job_id: str, session: SessionType):
+  job = get_job_or_404(job_id, session)
+  if job.status == SUCCEEDED:
+    return JSONResponse({ "job_id": job.id, "data": json.loads(job.result) }, status.HTTP_200_OK)
+  if job.status == FAILED:
+    return JSONResponse({ "job_id": job.id, "message": f"An error occurred: {job.error}" }, status.HTTP_500_INTERNAL_SERVER_ERROR)
+  # Not finished yet: poll again later
+  return JSONResponse({ "job_id": job.id, "status": job.status }, status.HTTP_202_ACCEPTED)
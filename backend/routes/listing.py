@@ -0,0 +1,59 @@
+from fastapi import APIRouter, HTTPException, status, Depends, Query
+from fastapi.responses import Response, StreamingResponse
+from typing import Annotated, Literal
+from db import AsyncSessionType
+from routes.auth.doctor import get_current_doctor
+import pagination
+import config
+
+
+router = APIRouter(
+  prefix='/list',
+  tags=['listing'],
+  dependencies=[Depends(get_current_doctor)]
+)
+
+Resource = Literal["doctors", "patients", "reports"]
+
+
+def bad_request(e: ValueError):
+  return HTTPException(status.HTTP_400_BAD_REQUEST, { "message": str(e) })
+
+
+@router.get('/{resource}')
+async def list_page(
+  resource: Resource,
+  session: AsyncSessionType,
+  fields: str | None = None,
+  order: str = "id",
+  desc: bool = False,
+  cursor: str | None = None,
+  limit: Annotated[int, Query(ge=1, le=config.LIST_MAX_PAGE_SIZE)] = config.LIST_PAGE_SIZE,
+):
+  listing = pagination.LISTINGS[resource]
+  try:
+    names = listing.parse_fields(fields)
+    after = pagination.decode_cursor(listing, order, cursor) if cursor else None
+    rows, next_keys = await pagination.fetch_page(session, listing, names, order, desc, after, limit)
+  except ValueError as e:
+    raise bad_request(e)
+  next_cursor = pagination.encode_cursor(next_keys) if next_keys is not None else None
+  # Encoded directly, the rows are plain JSON values already
+  return Response(
+    pagination.dumps({ "data": rows, "next_cursor": next_cursor }),
+    media_type="application/json",
+  )
+
+
+@router.get('/{resource}/export')
+async def export(resource: Resource, fields: str | None = None, order: str = "id", desc: bool = False):
+  listing = pagination.LISTINGS[resource]
+  try:
+    names = listing.parse_fields(fields)
+    listing.keys(order)
+  except ValueError as e:
+    raise bad_request(e)
+  return StreamingResponse(
+    pagination.stream_json(listing, names, order, desc, config.LIST_EXPORT_BATCH_SIZE),
+    media_type="application/json",
+  )
@@ -0,0 +1,39 @@
+from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi.responses import Response
+from sqlalchemy.orm import defer, selectinload
+from sqlmodel import select
+from entities import Patient, Report
+from db import AsyncSessionType
+from routes.auth.doctor import get_current_doctor
+from reports import report_summary
+import pagination
+
+
+router = APIRouter(
+  prefix='/patient',
+  tags=['patient'],
+  dependencies=[Depends(get_current_doctor)]
+)
+
+
+@router.get('/{patient_id}/history')
+async def get_history(patient_id: int, session: AsyncSessionType, include_masks: bool = False):
+  # The reports come in one more query, a range scan of ix_report_patient_date,
+  # instead of one query per report
+  reports = selectinload(Patient.reports)
+  if not include_masks:
+    # Masks are the bulk of a report row; leave them in the database
+    reports = reports.options(defer(Report.mask))
+  statement = select(Patient).where(Patient.id == patient_id).options(reports)
+  patient = (await session.exec(statement)).first()
+  if patient is None:
+    raise HTTPException(status.HTTP_404_NOT_FOUND, { "message": "Patient not found" })
+  return Response(
+    pagination.dumps({
+      "data": {
+        **patient.model_dump(),
+        "reports": [report_summary(report, include_masks) for report in patient.reports],
+      }
+    }),
+    media_type="application/json",
+  )
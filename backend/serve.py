@@ -0,0 +1,111 @@
+"""
+Production server: load the models once, then fork workers that share them.
+
+    python serve.py [--workers N] [--host HOST] [--port PORT] [--memory-report SECONDS]
+
+The master process binds the socket, imports the app (loading the
+memory-mapped checkpoints) and forks N uvicorn workers. The weights are never
+written after loading, so every worker serves from the same physical pages:
+file-backed pages of the checkpoints, or copy-on-write pages for converted
+models. Each worker gets cores / (N * INFERENCE_WORKERS) torch threads unless
+TORCH_NUM_THREADS is set, so the workers together do not oversubscribe the
+machine.
+"""
+import argparse
+import os
+import signal
+import socket
+import sys
+import time
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "2")))
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--memory-report", type=float, default=0, help="Log per-worker memory every N seconds")
+    return parser.parse_args(argv)
+
+
+def bind_socket(host, port):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(application, sock):
+    import uvicorn
+    server = uvicorn.Server(uvicorn.Config(application, log_level="info"))
+    server.run(sockets=[sock])
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Must be decided before config is imported, which reads it once
+    inference_workers = int(os.getenv("INFERENCE_WORKERS", "2"))
+    os.environ.setdefault("TORCH_NUM_THREADS", str(max(1, (os.cpu_count() or 1) // (args.workers * inference_workers))))
+
+    sock = bind_socket(args.host, args.port)
+
+    # Preload: models are loaded here, once, and inherited by every fork
+    import app
+    from db import create_db_and_table, engine
+    from procstats import format_memory, memory_usage
+    create_db_and_table()
+    # Connections must not be shared across processes
+    engine.dispose()
+    print(f"Master {os.getpid()} loaded models: {format_memory(memory_usage())}")
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            try:
+                run_worker(app.app, sock)
+            finally:
+                os._exit(0)
+        return pid
+
+    workers = {spawn() for _ in range(args.workers)}
+    stopping = False
+
+    def stop(signum, _frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    last_report = time.monotonic()
+    while workers:
+        pid, status = os.waitpid(-1, os.WNOHANG)
+        if pid:
+            workers.discard(pid)
+            if not stopping:
+                print(f"Worker {pid} exited with status {status}, restarting")
+                workers.add(spawn())
+            continue
+        if args.memory_report and time.monotonic() - last_report >= args.memory_report:
+            last_report = time.monotonic()
+            for worker in sorted(workers):
+                try:
+                    print(f"Worker {format_memory(memory_usage(worker))}")
+                except OSError:
+                    pass
+        time.sleep(0.5)
+    sock.close()
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
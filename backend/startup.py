@@ -0,0 +1,26 @@
+import time
+
+
+class StartupTimer:
+    """Breaks process startup into named phases, each timed from the previous mark."""
+    def __init__(self):
+        self.started = self._last = time.perf_counter()
+        self.phases = {}
+        self.total_ms = None
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases[phase] = round((now - self._last) * 1000, 1)
+        self._last = now
+
+    def record(self, phase, ms):
+        """Add a phase that was timed separately, e.g. in a background task."""
+        self.phases[phase] = round(ms, 1)
+
+    def finish(self):
+        self.total_ms = round((self._last - self.started) * 1000, 1)
+        breakdown = ", ".join(f"{phase} {ms:.0f} ms" for phase, ms in self.phases.items())
+        print(f"Startup finished in {self.total_ms:.0f} ms ({breakdown})")
+
+    def report(self):
+        return {"phases_ms": self.phases, "total_ms": self.total_ms}
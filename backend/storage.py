@@ -0,0 +1,216 @@
+import asyncio
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import time
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+# Content-addressed files are never rewritten under the same name
+IMMUTABLE = "public, max-age=31536000, immutable"
+ARTIFACT_NAME = re.compile(r"^([0-9a-f]{40})\.[a-z0-9]+$")
+SHARD = re.compile(r"^[0-9a-f]{2}$")
+# Leftover partial writes older than this are removed by the collector
+STALE_TMP_SECONDS = 3600
+# Serving an artifact refreshes its last-use time at most this often
+TOUCH_INTERVAL_SECONDS = 60
+
+
+def content_hash(data):
+    return hashlib.blake2b(data, digest_size=20).hexdigest()
+
+
+class ArtifactStore:
+    """
+    Content-addressed store for result artifacts under ``root``.
+
+    Files are named by the hash of their bytes and sharded two levels deep
+    (``ab/cd/abcd....png``), so identical results are stored once and
+    different uploads never overwrite each other. Storing an existing file
+    refreshes its mtime, as does serving it (see ``ArtifactFiles``), and the
+    collector uses the mtime as the last-use time: files
+    older than ``ttl`` seconds are removed, then the least recently used ones
+    until the store fits in ``max_bytes``. ``pinned``, if given, returns the
+    digests of artifacts that are referenced elsewhere (stored reports) and
+    are never collected.
+    """
+    def __init__(self, root, max_bytes=None, ttl=None, gc_interval=300, pinned=None):
+        self.root = root
+        self.pinned = pinned
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.gc_interval = gc_interval
+        self._task = None
+        self.evictions = 0
+        self.bytes = 0
+        os.makedirs(root, exist_ok=True)
+
+    def relative_path(self, digest, extension):
+        return f"{digest[:2]}/{digest[2:4]}/{digest}.{extension}"
+
+    def put(self, data, extension):
+        """Store ``data`` and return its path relative to ``root``."""
+        relative_path = self.relative_path(content_hash(data), extension)
+        path = os.path.join(self.root, relative_path)
+        if os.path.exists(path):
+            try:
+                os.utime(path)
+                return relative_path
+            except FileNotFoundError:
+                # Collected in the meantime, write it again
+                pass
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return relative_path
+
+    def _scan(self):
+        """List ``(mtime, size, path)`` of every artifact and partial write."""
+        entries = []
+        for first in os.listdir(self.root):
+            if not SHARD.match(first):
+                continue
+            for second in os.listdir(os.path.join(self.root, first)):
+                shard = os.path.join(self.root, first, second)
+                if not SHARD.match(second) or not os.path.isdir(shard):
+                    continue
+                with os.scandir(shard) as files:
+                    for entry in files:
+                        try:
+                            stat = entry.stat()
+                        except FileNotFoundError:
+                            continue
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def collect(self):
+        """Remove expired and least recently used artifacts; returns how many."""
+        now = time.time()
+        pins = self.pinned() if self.pinned is not None else set()
+        removed = 0
+        kept = []
+        for mtime, size, path in self._scan():
+            name = os.path.basename(path)
+            match = ARTIFACT_NAME.match(name)
+            if match and match.group(1) in pins:
+                expired = False
+            elif match:
+                expired = self.ttl and mtime + self.ttl < now
+            else:
+                expired = name.endswith(".tmp") and mtime + STALE_TMP_SECONDS < now
+            if expired:
+                removed += self._remove(path)
+            else:
+                kept.append((mtime, size, path))
+        total = sum(size for _, size, _ in kept)
+        if self.max_bytes:
+            kept.sort()
+            for _, size, path in kept:
+                if total <= self.max_bytes:
+                    break
+                match = ARTIFACT_NAME.match(os.path.basename(path))
+                if match and match.group(1) not in pins:
+                    removed += self._remove(path)
+                    total -= size
+        self.bytes = total
+        self.evictions += removed
+        return removed
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+            return 1
+        except FileNotFoundError:
+            # Another worker collected it first
+            return 0
+
+    def stats(self):
+        return {"bytes": self.bytes, "max_bytes": self.max_bytes, "evictions": self.evictions}
+
+    def start(self):
+        self._task = asyncio.create_task(self._collect_periodically())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _collect_periodically(self):
+        while True:
+            try:
+                removed = await asyncio.to_thread(self.collect)
+                if removed:
+                    print(f"Artifact store: removed {removed} files, {self.bytes} bytes in use")
+            except Exception as e:
+                print(f"Error: artifact garbage collection failed: {e}")
+            await asyncio.sleep(self.gc_interval)
+
+
+class ArtifactFiles(StaticFiles):
+    """
+    Static files where content-addressed artifacts are served with their hash
+    as a strong ETag and as immutable, so clients never revalidate them.
+    Each hit marks the artifact as used for ``ArtifactStore`` collection.
+    """
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        match = ARTIFACT_NAME.match(os.path.basename(full_path))
+        if match is None:
+            return super().file_response(full_path, stat_result, scope, status_code)
+        # Throttled, so popular artifacts do not cost a metadata write per hit
+        if stat_result.st_mtime < time.time() - TOUCH_INTERVAL_SECONDS:
+            try:
+                os.utime(full_path)
+            except FileNotFoundError:
+                pass
+        headers = {"etag": f'"{match.group(1)}"', "cache-control": IMMUTABLE}
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result, headers=headers)
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+def artifact_digest(url):
+    """The digest of a content-addressed artifact URL or path, else None."""
+    match = ARTIFACT_NAME.match(os.path.basename(url or ""))
+    return match.group(1) if match else None
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def setup_temp_dir(root):
+    """
+    Point ``tempfile`` (and so spooled uploads) at a private directory under
+    ``root`` for this process. Directories left behind by processes that are
+    no longer running, e.g. after a crash, are removed first. Returns the
+    directory; remove it with ``cleanup_temp_dir`` on shutdown.
+    """
+    os.makedirs(root, exist_ok=True)
+    for name in os.listdir(root):
+        pid = name.split("-", 1)[0]
+        if pid.isdigit() and not _pid_alive(int(pid)):
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+    path = tempfile.mkdtemp(prefix=f"{os.getpid()}-", dir=root)
+    tempfile.tempdir = path
+    return path
+
+
+def cleanup_temp_dir(path):
+    if tempfile.tempdir == path:
+        tempfile.tempdir = None
+    shutil.rmtree(path, ignore_errors=True)